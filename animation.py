@@ -0,0 +1,150 @@
+import numpy as np
+
+from mesh import PoseAtlas
+from pose import interpolatePoses, PoseEvaluator
+
+"""
+For the animation we want that each vertex travels in an elliptic curve
+from the start to the end point!
+
+Calculate the elliptic curve(centered in the origin) which connects the start
+and end vertex:
+x_e^2/a + y_e^2 = y_s^2 (_e ... end, _s ... start)
+The above elliptic equation has an unknown parameter a:
+a = x_e / sqrt(y_s^2 - y_e^2)
+Then to interpolate to get the new positions we parameterize the elliptic curve:
+x_new = a * y_s * cos(t)
+y_new = y_s * sin(t)
+Now we need start and stop value of t:
+t_s = pi/2 (this is always the case)
+t_e = arcsin(y_e/y_s) (this must be in radians which is the case using math lib)
+Now if we want to be like 50% (p=0.5) in the animation we get the t value with:
+t = t_s + p * (t_e - t_s)
+The new point will then be, using the above t value:
+x_new = a * y_s * cos(t)
+y_new = y_s * sin(t)
+"""
+class Animation():
+    """
+    The poses are evaluated on demand for any animation parameter p
+    (0.0 = start pose,... 1.0 = end pose) and cached (see PoseEvaluator),
+    pose_nr is the slot of the current pose in the atlas and the skin
+    """
+
+    def __init__(self, start_points, end_points, speed, resolution=1e-4, capacity=256,
+                 pool=None):
+        self.atlas = None
+        # the atlas is sub-allocated from the pool (see GeometryPool) if given:
+        self.pool = pool
+        self.skin = None
+        self.pose_nr = 0
+        # the ring centers of the current pose (bones x 3):
+        self.positions = None
+        # the slot of the poses which aren't evaluated here (see showPose):
+        self.stream_slot = None
+        self.p = 0.0
+        # change of p per second of the animation:
+        self.speed = speed
+        self.flag = True
+        self.paused = False
+        self.start_points = start_points
+        self.end_points = end_points
+        self.evaluator = PoseEvaluator(start_points.positions, end_points.positions,
+                                       resolution, capacity)
+
+    def interpolate(self, p):
+        return interpolatePoses(self.start_points.positions,
+                                self.end_points.positions, p)[0]
+
+    def createAtlas(self, colors, indices):
+        # the buffers of the old atlas are freed:
+        if self.atlas is not None:
+            self.atlas.delete()
+        # one buffer with a slot for each pose of the cache, colors and
+        # indices are shared:
+        positions = np.zeros((self.evaluator.capacity, len(colors), 3), dtype=np.float32)
+        self.atlas = PoseAtlas(positions, colors, indices, self.pool)
+
+    def reload(self, start_points, end_points):
+        """
+        Animates between new start and end points (same number of points),
+        the cached poses are evaluated again
+        """
+        self.start_points = start_points
+        self.end_points = end_points
+        self.evaluator = PoseEvaluator(start_points.positions, end_points.positions,
+                                       self.evaluator.resolution, self.evaluator.capacity)
+        self.stream_slot = None
+        if self.atlas is not None:
+            self.createAtlas(self.atlas.colors, self.atlas.indices)
+        self.updatePose()
+
+    def setSkin(self, skin):
+        """The skin gets the circle transformations of the cached poses"""
+        self.skin = skin
+        skin.allocate(self.evaluator.capacity)
+        for slot, positions, transforms in self.evaluator.cache.values():
+            skin.setTransforms(transforms, slot)
+
+    def updatePose(self, pose=None):
+        slot, positions, transforms, new = self.evaluator.evaluate(self.p, pose)
+        # only poses which are new in the cache are uploaded into their slot:
+        if new:
+            if self.atlas is not None:
+                self.atlas.setPose(slot, positions)
+            if self.skin is not None:
+                self.skin.setTransforms(transforms, slot)
+        self.pose_nr = slot
+        self.positions = positions
+
+    def setBend(self, p):
+        """
+        Selects the pose of the animation parameter p (0.0,... 1.0), returns
+        True if the pose changed
+        """
+        p = min(max(p, 0.0), 1.0)
+        if p == self.p:
+            return False
+        self.p = p
+        self.updatePose()
+        return True
+
+    def setPose(self, p, positions, transforms):
+        """
+        Like setBend, but the pose of p was calculated elsewhere (e.g. by the
+        SimulationWorker), it is only copied into the cache
+        """
+        p = min(max(p, 0.0), 1.0)
+        if p == self.p:
+            return False
+        self.p = p
+        self.updatePose((positions, transforms))
+        return True
+
+    def showPose(self, positions, transforms):
+        """
+        Shows a pose which isn't evaluated from p (e.g. received from a pose
+        publisher, see broadcast.py), it is uploaded into a slot of its own
+        """
+        if self.stream_slot is None:
+            self.stream_slot = self.evaluator.reserveSlot()
+        if self.atlas is not None:
+            self.atlas.setPose(self.stream_slot, positions)
+        if self.skin is not None:
+            self.skin.setTransforms(transforms, self.stream_slot)
+        self.pose_nr = self.stream_slot
+        self.positions = np.array(positions, dtype=np.float32)
+
+    def advance(self, deltaTime):
+        """Advances the animation by deltaTime seconds"""
+        if self.paused:
+            return False
+        # back and forth between the start and the end pose:
+        if self.p >= 1.0:
+            self.flag = False
+        elif self.p <= 0.0:
+            self.flag = True
+        if self.flag:
+            return self.setBend(self.p + self.speed * deltaTime)
+        return self.setBend(self.p - self.speed * deltaTime)
+
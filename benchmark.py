@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import platform
+import argparse
+
+"""
+Stage-level benchmarks of the actuator visualization, each stage is measured
+over the grid of n (number of bones), m (number of circle vertices) and
+p_step (interpolation step size) values it depends on:
+
+interpolation     -> interpolatePoses (n, p_step)
+transforms        -> computeBoneTransforms (n, p_step)
+pose_atlas        -> PoseAtlas creation and upload (n, p_step)
+cylinder_geometry -> createCylinder (m)
+mesh_upload       -> Mesh creation and upload of the skin (m)
+skin_draw         -> Skin.draw of one pose (n, m)
+
+The GL stages run on an offscreen context (--backend egl or osmesa, e.g.
+Mesa's software rasterizer), with --backend none only the CPU stages run.
+The results are written as JSON so that runs can be compared:
+
+python benchmark.py --backend osmesa --output bench.json
+"""
+parser = argparse.ArgumentParser(description="Stage benchmarks")
+parser.add_argument("--backend", default="egl", choices=["egl", "osmesa", "none"])
+parser.add_argument("--n", default="10,50,200", help="numbers of bones")
+parser.add_argument("--m", default="16,32,128", help="numbers of circle vertices")
+parser.add_argument("--p-step", default="0.01,0.001", help="interpolation step sizes")
+parser.add_argument("--repeat", type=int, default=5, help="measurements per stage")
+parser.add_argument("--output", default="bench.json")
+
+# the offscreen platform must be chosen before OpenGL is imported:
+if __name__ == '__main__':
+    args = parser.parse_args()
+    if args.backend != "none":
+        os.environ.setdefault("PYOPENGL_PLATFORM", args.backend)
+
+import numpy as np
+
+from geometry import createStartPoints, createEndPoints, createCylinder
+from pose import interpolatePoses, computeBoneTransforms
+
+
+"""
+Returns min, median and mean of repeat calls of function in seconds, cleanup
+is called with the result of each call outside of the timing (e.g. to free
+the created GL objects)
+"""
+def measure(function, repeat, cleanup=None):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+        if cleanup is not None:
+            cleanup(result)
+    return {"min_s": min(times),
+            "median_s": float(np.median(times)),
+            "mean_s": float(np.mean(times)),
+            "repeat": repeat}
+
+
+"""
+Returns the p values of an animation with the step size p_step (see Animation)
+"""
+def getAnimationParameters(p_step):
+    ps = np.arange(0.0 + p_step, 1.0 - p_step, p_step)
+    return np.concatenate(([0.0], ps, [1.0]))
+
+
+def benchmarkCPU(ns, ms, p_steps, repeat):
+    results = []
+    for n in ns:
+        start = createStartPoints(n, 2, [1.0, 0.0, 0.0, 1.0])[0]
+        end = createEndPoints(n, 2, [0.0, 1.0, 0.0, 1.0])[0]
+        for p_step in p_steps:
+            ps = getAnimationParameters(p_step)
+            result = measure(lambda: interpolatePoses(start, end, ps), repeat)
+            results.append(dict(stage="interpolation", n=n, p_step=p_step, **result))
+            poses = interpolatePoses(start, end, ps)
+            result = measure(lambda: computeBoneTransforms(poses), repeat)
+            results.append(dict(stage="transforms", n=n, p_step=p_step, **result))
+    for m in ms:
+        result = measure(lambda: createCylinder(m, 0.5, [0.0, 1.0, 0.0, 1.0]), repeat)
+        results.append(dict(stage="cylinder_geometry", m=m, **result))
+    return results
+
+
+def benchmarkGL(ns, ms, p_steps, repeat, backend):
+    from OpenGL.GL import glFinish, glViewport, glEnable, GL_DEPTH_TEST
+    import glm
+    from headless import createContext, Framebuffer
+    from shader import Shader, UniformBuffer
+    from mesh import Mesh, PoseAtlas
+    from skin import Skin
+
+    width, height = 1200, 600
+    context = createContext(width, height, backend)
+    framebuffer = Framebuffer(width, height)
+    framebuffer.bind()
+    glViewport(0, 0, width, height)
+    glEnable(GL_DEPTH_TEST)
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+    shader = Shader(os.path.join(directory, "shader.vs"), os.path.join(directory, "shader.fs"))
+    shader.use()
+    camera_ubo = UniformBuffer(["projection", "view"], 0)
+    shader.bindUniformBlock("Camera", camera_ubo.binding)
+    camera_ubo.setMatrix("projection", glm.perspective(glm.radians(45.0), width/height, 0.1, 100.0))
+    camera_ubo.setMatrix("view", glm.lookAt(glm.vec3(0.0, 0.0, 3.0), glm.vec3(0.0), glm.vec3(0.0, 1.0, 0.0)))
+
+    results = []
+    color = [0.0, 0.0, 1.0, 1.0]
+    for n in ns:
+        start, colors, indices = createStartPoints(n, 2, color)
+        end = createEndPoints(n, 2, color)[0]
+        for p_step in p_steps:
+            poses = interpolatePoses(start, end, getAnimationParameters(p_step))
+
+            def createAtlas():
+                atlas = PoseAtlas(poses, colors, indices)
+                glFinish()
+                return atlas
+            # the buffers of each atlas are freed before the next one:
+            result = measure(createAtlas, repeat, cleanup=PoseAtlas.delete)
+            results.append(dict(stage="pose_atlas", n=n, p_step=p_step, **result))
+
+    for m in ms:
+        geometry = createCylinder(m, 0.5, color)
+
+        def uploadMesh():
+            mesh = Mesh(*geometry)
+            glFinish()
+            return mesh
+        result = measure(uploadMesh, repeat, cleanup=Mesh.delete)
+        results.append(dict(stage="mesh_upload", m=m, **result))
+
+        skin_mesh = Mesh(*geometry)
+        shader.setInt("objectSize", m + 1)
+        for n in ns:
+            start = createStartPoints(n, 2, color)[0]
+            end = createEndPoints(n, 2, color)[0]
+            skin = Skin(skin_mesh, m, n)
+            skin.setTransforms(computeBoneTransforms(interpolatePoses(start, end, 0.5)))
+
+            def drawSkin():
+                skin.draw(shader)
+                glFinish()
+            result = measure(drawSkin, repeat)
+            results.append(dict(stage="skin_draw", n=n, m=m, **result))
+            skin.delete()
+        skin_mesh.delete()
+
+    framebuffer.destroy()
+    context.destroy()
+    return results
+
+
+if __name__ == '__main__':
+    ns = [int(x) for x in args.n.split(",")]
+    ms = [int(x) for x in args.m.split(",")]
+    p_steps = [float(x) for x in args.p_step.split(",")]
+
+    results = benchmarkCPU(ns, ms, p_steps, args.repeat)
+    if args.backend != "none":
+        results.extend(benchmarkGL(ns, ms, p_steps, args.repeat, args.backend))
+
+    for result in results:
+        parameters = ", ".join("{}={}".format(key, result[key])
+                               for key in ("n", "m", "p_step") if key in result)
+        print("{:<18} {:<30} median[s]: {:.6f}".format(result["stage"], parameters, result["median_s"]))
+
+    report = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "backend": args.backend,
+              "python": platform.python_version(),
+              "numpy": np.__version__,
+              "machine": platform.machine(),
+              "results": results}
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print("Results written to", args.output)
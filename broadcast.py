@@ -0,0 +1,323 @@
+import io
+import os
+import math
+import time
+import socket
+import struct
+import selectors
+import threading
+import numpy as np
+
+from pose import computeBoneTransforms
+from sensor import openSource
+from simulation import PoseState, TripleBuffer
+
+"""
+Pose broadcast: one publisher computes the poses (see SimulationWorker) and
+streams them to any number of subscribers (e.g. main.py --subscribe), which
+only draw them.
+
+A frame is a header (FRAME) followed by the bone positions:
+magic, kind, bones, frame id, keyframe id, time (time.time() when the input
+was read), bend, pressure (NaN = none), quantum
+keyframe -> positions as float32 (bones x 3)
+delta    -> positions - positions of the keyframe as int16 in units of
+            quantum (bones x 3)
+
+Each frame is encoded once and the same bytes are sent to every subscriber,
+a delta only needs its keyframe (not the frames in between), so the
+publisher's work per frame doesn't grow with the number of subscribers. A
+keyframe is sent every keyframe_interval frames or when a delta doesn't fit
+into int16. The sockets don't block: while a subscriber hasn't taken the
+rest of an earlier frame the new frames are dropped for it, a subscriber
+which missed the current keyframe gets it before the next frame.
+
+Addresses: tcp://host:port or unix:///path/to/socket
+"""
+MAGIC = b"PSVF"
+KEYFRAME = 0
+DELTA = 1
+FRAME = struct.Struct("<4sBxHIIdfff")
+
+
+"""
+Returns a listening socket for the address
+"""
+def createServer(address):
+    if address.startswith("tcp://"):
+        host, port = address[len("tcp://"):].rsplit(":", 1)
+        return socket.create_server((host or "localhost", int(port)))
+    if address.startswith("unix://"):
+        path = address[len("unix://"):]
+        if os.path.exists(path):
+            os.remove(path) # left over from an earlier run
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        server.listen()
+        return server
+    raise ValueError("unknown address: " + address)
+
+
+class Subscription():
+    """A connected subscriber of the publisher"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.pending = b"" # the rest of a frame which wasn't sent completely
+        self.keyframe_id = None # the last keyframe the subscriber got
+        self.sent = 0
+        self.dropped = 0
+
+
+class PosePublisher():
+
+    def __init__(self, address, keyframe_interval=60, quantum=2.0**-12):
+        self.address = address
+        self.keyframe_interval = keyframe_interval
+        self.quantum = quantum
+        self.server = createServer(address)
+        self.server.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.server, selectors.EVENT_READ)
+        self.subscriptions = {}
+        self.frame_id = 0
+        self.keyframe = None # (frame id, positions, encoded frame)
+        self.frames = 0
+        self.keyframes = 0
+        self.bytes = 0 # encoded bytes (once per frame, not per subscriber)
+        self.dropped = 0
+        self.seconds = 0.0 # time spent encoding and sending
+
+    def poll(self):
+        """Accepts new subscribers and removes the closed ones"""
+        for key, _ in self.selector.select(timeout=0):
+            if key.fileobj is self.server:
+                connection, _ = self.server.accept()
+                connection.setblocking(False)
+                self.subscriptions[connection] = Subscription(connection)
+                self.selector.register(connection, selectors.EVENT_READ)
+            else:
+                # subscribers don't send anything, readable means closed:
+                try:
+                    closed = not key.fileobj.recv(4096)
+                except OSError:
+                    closed = True
+                if closed:
+                    self.remove(self.subscriptions[key.fileobj])
+
+    def remove(self, subscription):
+        self.selector.unregister(subscription.connection)
+        subscription.connection.close()
+        del self.subscriptions[subscription.connection]
+
+    def encode(self, positions, frame_time, bend, pressure):
+        """Returns the frame (bytes) and if it is a keyframe"""
+        positions = np.asarray(positions, dtype=np.float32)
+        pressure = math.nan if pressure is None else pressure
+        if self.keyframe is not None and self.frame_id - self.keyframe[0] < self.keyframe_interval \
+                and len(positions) == len(self.keyframe[1]):
+            deltas = np.rint((positions - self.keyframe[1]) / self.quantum)
+            if np.abs(deltas).max() <= 32767:
+                header = FRAME.pack(MAGIC, DELTA, len(positions), self.frame_id, self.keyframe[0],
+                                    frame_time, bend, pressure, self.quantum)
+                return header + deltas.astype("<i2").tobytes(), False
+        header = FRAME.pack(MAGIC, KEYFRAME, len(positions), self.frame_id, self.frame_id,
+                            frame_time, bend, pressure, self.quantum)
+        frame = header + positions.astype("<f4").tobytes()
+        self.keyframe = (self.frame_id, positions.copy(), frame)
+        return frame, True
+
+    def publish(self, positions, frame_time, bend, pressure=None):
+        """Sends a frame to all subscribers (without waiting for any of them)"""
+        start = time.perf_counter()
+        self.poll()
+        self.frame_id += 1
+        frame, keyframe = self.encode(positions, frame_time, bend, pressure)
+        self.frames += 1
+        self.keyframes += keyframe
+        self.bytes += len(frame)
+        keyframe_id = self.keyframe[0]
+        for subscription in list(self.subscriptions.values()):
+            if subscription.pending:
+                # still busy with an earlier frame:
+                self.send(subscription, b"")
+                if subscription.connection not in self.subscriptions:
+                    continue
+                if subscription.pending:
+                    subscription.dropped += 1
+                    self.dropped += 1
+                    continue
+            data = frame
+            if subscription.keyframe_id != keyframe_id and not keyframe:
+                # the keyframe of the delta was dropped for this subscriber:
+                data = self.keyframe[2] + frame
+            subscription.keyframe_id = keyframe_id
+            subscription.sent += 1
+            self.send(subscription, data)
+        self.seconds += time.perf_counter() - start
+
+    def send(self, subscription, data):
+        data = subscription.pending + data
+        try:
+            sent = subscription.connection.send(data)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self.remove(subscription)
+            return
+        subscription.pending = data[sent:]
+
+    def close(self):
+        for subscription in list(self.subscriptions.values()):
+            self.remove(subscription)
+        self.selector.close()
+        self.server.close()
+        if self.address.startswith("unix://"):
+            os.remove(self.address[len("unix://"):])
+
+    def __repr__(self):
+        frames = max(self.frames, 1)
+        return ("Pose publisher {} -- subscribers: {}, frames: {} (keyframes: {}), bytes per frame: "
+                "{:.1f}, dropped: {}, time per frame: {:.1f} us").format(
+                self.address, len(self.subscriptions), self.frames, self.keyframes,
+                self.bytes / frames, self.dropped, self.seconds / frames * 1e6)
+
+
+class PoseSubscriber(threading.Thread):
+    """
+    Receives the frames of a publisher in the background, the newest decoded
+    pose (with its circle transformations) is taken with acquire like the
+    states of a SimulationWorker
+    """
+
+    def __init__(self, address):
+        super().__init__(daemon=True)
+        self.address = address
+        self.file = io.BufferedReader(openSource(address))
+        self.buffer = None # created with the first frame (number of bones)
+        self.keyframe = None # (frame id, positions)
+        self.running = True
+        self.paused = False # the publisher decides
+        self.frames = 0
+        self.undecodable = 0 # deltas without their keyframe
+        self.latency_sum = 0.0 # time.time() of receiving - time of the frame
+        self.latency_max = 0.0
+
+    def run(self):
+        try:
+            while self.running:
+                header = self.file.read(FRAME.size)
+                if len(header) < FRAME.size:
+                    break
+                magic, kind, bones, frame_id, keyframe_id, frame_time, bend, pressure, quantum = \
+                        FRAME.unpack(header)
+                if magic != MAGIC:
+                    raise ValueError("{} doesn't send pose frames".format(self.address))
+                size = bones * (12 if kind == KEYFRAME else 6)
+                payload = self.file.read(size)
+                if len(payload) < size:
+                    break
+                if kind == KEYFRAME:
+                    positions = np.frombuffer(payload, dtype="<f4").reshape(bones, 3)
+                    self.keyframe = (frame_id, positions)
+                else:
+                    deltas = np.frombuffer(payload, dtype="<i2").reshape(bones, 3)
+                    if self.keyframe is None or self.keyframe[0] != keyframe_id:
+                        self.undecodable += 1
+                        continue
+                    positions = self.keyframe[1] + deltas * np.float32(quantum)
+                self.receive(frame_id, frame_time, bend, pressure, positions)
+        except OSError:
+            pass
+        self.running = False
+
+    def receive(self, frame_id, frame_time, bend, pressure, positions):
+        if self.buffer is None:
+            self.buffer = TripleBuffer(lambda: PoseState(len(positions)))
+        latency = time.time() - frame_time
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        self.frames += 1
+        state = self.buffer.getBack()
+        state.sequence = frame_id
+        state.time = time.perf_counter()
+        state.p = bend
+        state.pressure = None if math.isnan(pressure) else pressure
+        state.positions[:] = positions
+        state.transforms[:] = computeBoneTransforms(positions)
+        self.buffer.publish()
+
+    def acquire(self):
+        """Returns the newest pose state or None if there is no new one"""
+        if self.buffer is None:
+            return None
+        state, new = self.buffer.acquire()
+        return state if new else None
+
+    def stop(self):
+        self.running = False
+        try:
+            self.file.close()
+        except OSError:
+            pass
+
+    def __repr__(self):
+        frames = max(self.frames, 1)
+        buffer = self.buffer
+        return ("Pose subscriber {} -- frames: {}, shown: {}, dropped: {}, undecodable: {}, "
+                "latency[ms] mean: {:.2f}, max: {:.2f}").format(
+                self.address, self.frames, buffer.acquired if buffer else 0,
+                buffer.dropped if buffer else 0, self.undecodable,
+                self.latency_sum / frames * 1000.0, self.latency_max * 1000.0)
+
+
+if __name__ == '__main__':
+    # the publisher: computes the poses once for all subscribers (no window)
+    import argparse
+    from geometry import createStartPoints, createEndPoints
+    from filters import parseFilters
+    from sensor import SensorInput
+    from simulation import SimulationWorker
+
+    parser = argparse.ArgumentParser(description="Pose broadcast server")
+    parser.add_argument("address", help="tcp://host:port or unix:///path")
+    parser.add_argument("--sensor", default=None, help="sensor source (see main.py --sensor)")
+    parser.add_argument("--sensor-rate", type=float, default=5000.0)
+    parser.add_argument("--filters", default="outliers:3,decimate:10,ema:0.02")
+    parser.add_argument("--speed", type=float, default=0.6)
+    parser.add_argument("--update-rate", type=float, default=120.0, help="pose updates per second")
+    parser.add_argument("--rate", type=float, default=60.0, help="frames per second")
+    parser.add_argument("--keyframe-interval", type=int, default=60)
+    args = parser.parse_args()
+    if args.update_rate <= 0 or args.rate <= 0:
+        parser.error("--update-rate and --rate must be positive")
+
+    color = [0.0, 0.0, 0.0, 1.0]
+    sensor = filters = None
+    if args.sensor is not None:
+        sensor = SensorInput(args.sensor)
+        filters = parseFilters(args.filters, args.sensor_rate)
+        sensor.start()
+    worker = SimulationWorker(createStartPoints(10, 2, color)[0], createEndPoints(10, 2, color)[0],
+                              args.speed, args.update_rate, sensor=sensor, filters=filters)
+    worker.start()
+    publisher = PosePublisher(args.address, args.keyframe_interval)
+    print("Publishing poses on", args.address)
+    next_frame = time.perf_counter()
+    try:
+        while True:
+            state = worker.acquire()
+            if state is not None:
+                frame_time = time.time() - (time.perf_counter() - state.time)
+                publisher.publish(state.positions, frame_time, state.p, state.pressure)
+            next_frame += 1.0 / args.rate
+            delay = next_frame - time.perf_counter()
+            if delay > 0.0:
+                time.sleep(delay)
+            else:
+                next_frame = time.perf_counter()
+    except KeyboardInterrupt:
+        worker.stop()
+        print(worker)
+        print(publisher)
+        publisher.close()
@@ -0,0 +1,222 @@
+import bisect
+from OpenGL.GL import *
+
+"""
+Sub-allocation of vertex and index data from a few large buffers instead of
+one buffer per mesh, e.g.:
+
+vertex_pool = BufferPool(GL_ARRAY_BUFFER)
+allocation = vertex_pool.allocate(data.nbytes, owner=mesh)
+vertex_pool.upload(allocation, data)
+...
+vertex_pool.release(allocation)
+
+The buffers (blocks) have block_size bytes (larger allocations get a block
+of their own). The free ranges of each block are kept sorted by offset and
+neighbouring free ranges are merged on release, so released ranges are
+reused by later allocations. compact moves the live allocations of each
+block to the front of a new buffer (glCopyBufferSubData) and deletes empty
+blocks, the owner of a moved allocation is told with owner.relocate() and
+has to point its attributes to the new buffer and offset.
+"""
+class RangeAllocator():
+    """First fit allocation of byte ranges in [0, capacity)"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        # sorted by offset: (offset, size)
+        self.free = [(0, capacity)]
+        self.allocated = 0
+
+    def allocate(self, size, alignment=16):
+        """Returns the offset of the range or None if there is no space"""
+        for i, (offset, free_size) in enumerate(self.free):
+            start = -(-offset // alignment) * alignment
+            padding = start - offset
+            if free_size - padding < size:
+                continue
+            ranges = []
+            if padding:
+                ranges.append((offset, padding))
+            if free_size - padding > size:
+                ranges.append((start + size, free_size - padding - size))
+            self.free[i:i + 1] = ranges
+            self.allocated += size
+            return start
+        return None
+
+    def release(self, offset, size):
+        self.allocated -= size
+        i = bisect.bisect(self.free, (offset, size))
+        # merge with the free neighbours:
+        if i < len(self.free) and self.free[i][0] == offset + size:
+            size += self.free[i][1]
+            del self.free[i]
+        if i > 0 and self.free[i - 1][0] + self.free[i - 1][1] == offset:
+            i -= 1
+            offset = self.free[i][0]
+            size += self.free[i][1]
+            del self.free[i]
+        self.free.insert(i, (offset, size))
+
+    def isPacked(self):
+        """True if there is no free range in front of an allocated one"""
+        free = self.free
+        return not free or (len(free) == 1 and free[0][0] + free[0][1] == self.capacity)
+
+    def largestFree(self):
+        return max((size for _, size in self.free), default=0)
+
+    def freeBytes(self):
+        return sum(size for _, size in self.free)
+
+
+class Allocation():
+
+    def __init__(self, block, offset, size, owner):
+        self.block = block
+        self.offset = offset
+        self.size = size
+        self.owner = owner
+
+    @property
+    def buffer(self):
+        return self.block.id
+
+
+class Block():
+
+    def __init__(self, usage, capacity):
+        self.capacity = capacity
+        self.ranges = RangeAllocator(capacity)
+        self.allocations = set()
+        self.id = glGenBuffers(1)
+        # the copy target works for vertex and index data (no VAO needed):
+        glBindBuffer(GL_COPY_WRITE_BUFFER, self.id)
+        glBufferData(GL_COPY_WRITE_BUFFER, capacity, None, usage)
+        glBindBuffer(GL_COPY_WRITE_BUFFER, 0)
+
+
+class BufferPool():
+
+    def __init__(self, target=GL_ARRAY_BUFFER, usage=GL_STATIC_DRAW,
+                 block_size=4 * 2**20, alignment=16):
+        self.target = target
+        self.usage = usage
+        self.block_size = block_size
+        self.alignment = alignment
+        self.blocks = []
+        self.released = 0 # number of released allocations since the start
+        self.moved = 0 # number of allocations moved by compact
+
+    def allocate(self, size, owner=None):
+        size = max(size, 1)
+        for block in self.blocks:
+            offset = block.ranges.allocate(size, self.alignment)
+            if offset is not None:
+                break
+        else:
+            block = Block(self.usage, max(self.block_size, size))
+            self.blocks.append(block)
+            offset = block.ranges.allocate(size, self.alignment)
+        allocation = Allocation(block, offset, size, owner)
+        block.allocations.add(allocation)
+        return allocation
+
+    def upload(self, allocation, data, offset=0):
+        """Writes data (bytes or array) at offset bytes into the allocation"""
+        glBindBuffer(GL_COPY_WRITE_BUFFER, allocation.buffer)
+        glBufferSubData(GL_COPY_WRITE_BUFFER, allocation.offset + offset, data.nbytes, data)
+        glBindBuffer(GL_COPY_WRITE_BUFFER, 0)
+
+    def release(self, allocation):
+        block = allocation.block
+        block.allocations.remove(allocation)
+        block.ranges.release(allocation.offset, allocation.size)
+        allocation.block = None
+        self.released += 1
+
+    def compact(self):
+        """
+        Packs the live allocations of each block into a new buffer and
+        deletes the blocks without allocations, returns the number of moved
+        allocations
+        """
+        moved = []
+        blocks = []
+        for block in self.blocks:
+            if not block.allocations:
+                glDeleteBuffers(1, [block.id])
+                continue
+            blocks.append(block)
+            if block.ranges.isPacked():
+                continue
+            new_id = glGenBuffers(1)
+            glBindBuffer(GL_COPY_WRITE_BUFFER, new_id)
+            glBufferData(GL_COPY_WRITE_BUFFER, block.capacity, None, self.usage)
+            glBindBuffer(GL_COPY_READ_BUFFER, block.id)
+            ranges = RangeAllocator(block.capacity)
+            for allocation in sorted(block.allocations, key=lambda a: a.offset):
+                offset = ranges.allocate(allocation.size, self.alignment)
+                glCopyBufferSubData(GL_COPY_READ_BUFFER, GL_COPY_WRITE_BUFFER,
+                                    allocation.offset, offset, allocation.size)
+                allocation.offset = offset
+                moved.append(allocation)
+            glBindBuffer(GL_COPY_READ_BUFFER, 0)
+            glBindBuffer(GL_COPY_WRITE_BUFFER, 0)
+            glDeleteBuffers(1, [block.id])
+            block.id = new_id
+            block.ranges = ranges
+        self.blocks = blocks
+        # the buffer (and maybe the offset) changed:
+        for allocation in moved:
+            if allocation.owner is not None:
+                allocation.owner.relocate()
+        self.moved += len(moved)
+        return len(moved)
+
+    def delete(self):
+        for block in self.blocks:
+            glDeleteBuffers(1, [block.id])
+        self.blocks = []
+
+    def getStats(self):
+        capacity = sum(block.capacity for block in self.blocks)
+        allocated = sum(block.ranges.allocated for block in self.blocks)
+        free = sum(block.ranges.freeBytes() for block in self.blocks)
+        largest = max((block.ranges.largestFree() for block in self.blocks), default=0)
+        return {"blocks": len(self.blocks),
+                "capacity_bytes": capacity,
+                "allocated_bytes": allocated,
+                "free_bytes": free,
+                "live_allocations": sum(len(block.allocations) for block in self.blocks),
+                "released": self.released,
+                # 0.0 = all free space in one range,... 1.0 = in many small ranges:
+                "fragmentation": 1.0 - largest / free if free else 0.0}
+
+    def __repr__(self):
+        stats = self.getStats()
+        return ("Buffer pool -- blocks: {blocks}, allocated: {allocated_bytes}/{capacity_bytes} bytes, "
+                "live allocations: {live_allocations}, released: {released}, "
+                "fragmentation: {fragmentation:.1%}").format(**stats)
+
+
+class GeometryPool():
+    """One pool for vertex and one for index data, used by Mesh and PoseAtlas"""
+
+    def __init__(self, block_size=4 * 2**20, usage=GL_STATIC_DRAW):
+        self.vertices = BufferPool(GL_ARRAY_BUFFER, usage, block_size)
+        self.indices = BufferPool(GL_ELEMENT_ARRAY_BUFFER, usage, block_size)
+
+    def compact(self):
+        return self.vertices.compact() + self.indices.compact()
+
+    def delete(self):
+        self.vertices.delete()
+        self.indices.delete()
+
+    def getStats(self):
+        return {"vertices": self.vertices.getStats(), "indices": self.indices.getStats()}
+
+    def __repr__(self):
+        return "vertices: {}\nindices: {}".format(self.vertices, self.indices)
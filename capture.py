@@ -0,0 +1,156 @@
+import os
+import zlib
+import queue
+import struct
+import threading
+import ctypes
+from ctypes import c_void_p
+import numpy as np
+from OpenGL.GL import *
+
+"""
+Asynchronous frame capture: glReadPixels writes into one of delay pixel
+buffer objects and returns without waiting for the GPU, the PBO is mapped
+delay frames later when its data is ready. The frames are written by a writer
+thread as PNG images (path is a directory) or as raw RGBA frames into one
+memory-mapped file (path ends with .rgba, frame after frame, top row first).
+If the writer can't keep up, frames are dropped instead of stalling the
+render loop.
+"""
+class FrameCapture():
+
+    def __init__(self, width, height, path, delay=3, queue_size=32):
+        self.width = width
+        self.height = height
+        self.path = path
+        self.raw = path.endswith(".rgba")
+        self.frame_bytes = width * height * 4
+        self.frame = 0 # number of frames read into the PBOs
+        self.dropped = 0
+        self.written = 0
+        self.max_queue_depth = 0
+        if self.raw:
+            open(path, "wb").close()
+        else:
+            os.makedirs(path, exist_ok=True)
+
+        self.PBOs = glGenBuffers(delay) if delay > 1 else [glGenBuffers(1)]
+        for PBO in self.PBOs:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, PBO)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.frame_bytes, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.writer = threading.Thread(target=self.write, daemon=True)
+        self.writer.start()
+
+    def capture(self):
+        """Call after the frame is drawn (before the buffer swap)"""
+        PBO = self.PBOs[self.frame % len(self.PBOs)]
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, PBO)
+        # the PBO still holds the frame from len(PBOs) frames ago:
+        if self.frame >= len(self.PBOs):
+            self.readPBO(self.frame - len(self.PBOs))
+        # asynchronous, the pixels are copied into the PBO by the GPU:
+        glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, c_void_p(0))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.frame += 1
+
+    def readPBO(self, frame_nr):
+        """Copies the pixels of the bound PBO and hands them to the writer"""
+        pointer = glMapBuffer(GL_PIXEL_PACK_BUFFER, GL_READ_ONLY)
+        pointer = ctypes.cast(pointer, ctypes.POINTER(ctypes.c_ubyte))
+        pixels = np.ctypeslib.as_array(pointer, shape=(self.height, self.width, 4)).copy()
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        try:
+            self.queue.put_nowait((frame_nr, pixels))
+        except queue.Full:
+            self.dropped += 1
+        self.max_queue_depth = max(self.max_queue_depth, self.queue.qsize())
+
+    def finish(self):
+        """Writes the frames which are still in the PBOs, waits for the writer"""
+        first = max(self.frame - len(self.PBOs), 0)
+        for frame_nr in range(first, self.frame):
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, self.PBOs[frame_nr % len(self.PBOs)])
+            self.readPBO(frame_nr)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        glDeleteBuffers(len(self.PBOs), self.PBOs)
+        self.queue.put(None)
+        self.writer.join()
+        print(self)
+
+    def write(self):
+        """Writer thread"""
+        frames = None
+        capacity = 0
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            frame_nr, pixels = item
+            # OpenGL starts with the bottom row:
+            pixels = pixels[::-1]
+            if not self.raw:
+                writePNG(os.path.join(self.path, "frame_{:06d}.png".format(frame_nr)), pixels)
+            else:
+                if self.written == capacity:
+                    # grow the memory-mapped file (doubling the size):
+                    capacity = max(2 * capacity, 64)
+                    if frames is not None:
+                        frames.flush()
+                        del frames
+                    with open(self.path, "ab") as file:
+                        file.truncate(capacity * self.frame_bytes)
+                    frames = np.memmap(self.path, dtype=np.uint8, mode="r+",
+                                       shape=(capacity, self.height, self.width, 4))
+                frames[self.written] = pixels
+            self.written += 1
+        if frames is not None:
+            frames.flush()
+            del frames
+            # cut off the unused frames:
+            with open(self.path, "r+b") as file:
+                file.truncate(self.written * self.frame_bytes)
+
+    def __repr__(self):
+        return "Capture {} -- frames: {}, written: {}, dropped: {}, max queue depth: {}".format(
+                self.path, self.frame, self.written, self.dropped, self.max_queue_depth)
+
+
+"""
+Returns path if nothing exists there yet, otherwise the path with the first
+free suffix, e.g. capture_1 or frames_1.rgba, so a new recording session
+doesn't overwrite the frames of an earlier one
+"""
+def getSessionPath(path):
+    base, extension = os.path.splitext(path.rstrip(os.sep))
+    if extension != ".rgba":
+        base, extension = path.rstrip(os.sep), ""
+    session = 0
+    while os.path.exists(path):
+        session += 1
+        path = "{}_{}{}".format(base, session, extension)
+    return path
+
+
+"""
+Writes the RGBA pixels (height x width x 4, uint8) as PNG image, zlib
+releases the GIL while compressing
+"""
+def writePNG(filename, pixels):
+    height, width, _ = pixels.shape
+    # every row starts with the filter type 0 (no filter):
+    rows = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    rows[:, 1:] = pixels.reshape(height, -1)
+
+    def chunk(kind, data):
+        return (struct.pack(">I", len(data)) + kind + data +
+                struct.pack(">I", zlib.crc32(kind + data) & 0xffffffff))
+
+    with open(filename, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        # 8 bit per channel, color type 6 = RGBA:
+        file.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0)))
+        file.write(chunk(b"IDAT", zlib.compress(rows.tobytes(), 6)))
+        file.write(chunk(b"IEND", b""))
@@ -0,0 +1,33 @@
+import numpy as np
+
+"""
+Pressure -> RGBA colors with a lookup table, a whole array of pressures is
+converted at once (no Python loop per vertex).
+
+The default colors go from blue (low pressure) over green and yellow to
+red (high pressure).
+"""
+PRESSURE_COLORS = [[0.0, 0.0, 1.0, 1.0],
+                   [0.0, 1.0, 0.0, 1.0],
+                   [1.0, 1.0, 0.0, 1.0],
+                   [1.0, 0.0, 0.0, 1.0]]
+
+
+class Colormap():
+
+    def __init__(self, colors=PRESSURE_COLORS, size=256, vmin=0.0, vmax=1.0):
+        colors = np.asarray(colors, dtype=np.float32)
+        # linear interpolation between the given colors:
+        x = np.linspace(0.0, 1.0, size)
+        xp = np.linspace(0.0, 1.0, len(colors))
+        self.lut = np.stack([np.interp(x, xp, colors[:, c]) for c in range(4)],
+                            axis=1).astype(np.float32)
+        self.vmin = vmin
+        self.vmax = vmax
+
+    def __call__(self, values):
+        """Returns the RGBA colors (... x 4) of the values (...)"""
+        values = np.asarray(values, dtype=np.float32)
+        scale = (len(self.lut) - 1) / (self.vmax - self.vmin)
+        indices = np.clip((values - self.vmin) * scale + 0.5, 0, len(self.lut) - 1)
+        return self.lut[indices.astype(np.intp)]
@@ -0,0 +1,174 @@
+import os
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from pose import PoseInterpolator, computeBoneTransforms
+from geometry import createStartPoints, createEndPoints, createCylinder
+
+"""
+Offline export of the animation for whole sensor logs, without a window and
+without pygame or OpenGL:
+
+bones      -> (samples x n x 3) bone positions (see PoseInterpolator)
+transforms -> (samples x n x 4 x 4) row-major circle transformations
+              (see computeBoneTransforms)
+skin       -> (samples x n x m x 3) positions of the ring vertices of the
+              skin (the circle of createCylinder transformed onto each bone)
+bends      -> (samples) and times (samples, if the input has times)
+
+The input is a recording (see recording.py), a .npy file with the bends
+(samples) or with sensor samples (samples x 3: time, bend, pressure). It is
+memory-mapped and split into chunks of chunk_size samples, the chunks are
+computed by a process pool. With --format npy each output is one .npy file
+which all workers map (np.lib.format.open_memmap) and write their chunks
+into, nothing is sent back to the main process and the outputs can be
+larger than the memory. With --format chunks each chunk is written as files
+of its own (e.g. bones_00003.npy).
+
+python export.py log.rec --output export --outputs bones,transforms --workers 8
+"""
+OUTPUTS = ("bones", "transforms", "skin")
+
+
+"""
+Returns the bends and the times (or None) of the input, both memory-mapped
+"""
+def loadInput(path):
+    if path.endswith(".npy"):
+        data = np.load(path, mmap_mode="r")
+        if data.ndim == 1:
+            return data, None
+        return data[:, 1], data[:, 0]
+    from recording import Recording
+    records = Recording(path).records
+    return records[:, 1], records[:, 0]
+
+
+"""
+Returns the shape of one sample of each output
+"""
+def getSampleShapes(n, m):
+    return {"bones": (n, 3), "transforms": (n, 4, 4), "skin": (n, m, 3)}
+
+
+class Exporter():
+    """The work of one process: computes and writes the outputs of chunks"""
+
+    def __init__(self, input_path, directory, outputs, file_format,
+                 n=10, r=2, m=32, skin_radius=0.5):
+        self.bends = loadInput(input_path)[0]
+        self.directory = directory
+        self.outputs = outputs
+        self.file_format = file_format
+        color = [0.0, 0.0, 0.0, 1.0]
+        self.interpolator = PoseInterpolator(createStartPoints(n, r, color)[0],
+                                             createEndPoints(n, r, color)[0])
+        # the vertices of circle2 without its center:
+        self.circle = np.asarray(createCylinder(m, skin_radius, color)[0][m + 2:], dtype=np.float32)
+        self.arrays = {}
+        if file_format == "npy":
+            for name in outputs:
+                self.arrays[name] = np.lib.format.open_memmap(
+                        os.path.join(directory, name + ".npy"), mode="r+")
+
+    def compute(self, first, last):
+        bends = np.clip(np.asarray(self.bends[first:last], dtype=np.float64), 0.0, 1.0)
+        results = {}
+        bones = self.interpolator.interpolate(bends)
+        results["bones"] = bones
+        if "transforms" in self.outputs or "skin" in self.outputs:
+            transforms = computeBoneTransforms(bones)
+            results["transforms"] = transforms
+            if "skin" in self.outputs:
+                # rotation and translation of every ring vertex:
+                skin = np.einsum("pnij,mj->pnmi", transforms[..., :3, :3], self.circle)
+                results["skin"] = skin + transforms[:, :, None, :3, 3]
+        return results
+
+    def export(self, chunk_nr, first, last):
+        results = self.compute(first, last)
+        for name in self.outputs:
+            if self.file_format == "npy":
+                self.arrays[name][first:last] = results[name]
+            else:
+                np.save(os.path.join(self.directory, "{}_{:05d}.npy".format(name, chunk_nr)),
+                        results[name])
+        if self.file_format == "npy":
+            for array in self.arrays.values():
+                array.flush()
+        return last - first
+
+
+# the exporter of a worker process (see initWorker):
+worker = None
+
+
+def initWorker(*args):
+    global worker
+    worker = Exporter(*args)
+
+
+def exportChunk(chunk_nr, first, last):
+    return worker.export(chunk_nr, first, last)
+
+
+"""
+Exports the outputs of all samples of input_path into directory, returns the
+number of samples per second
+"""
+def exportAll(input_path, directory, outputs=OUTPUTS, file_format="npy", workers=None,
+              chunk_size=65536, n=10, r=2, m=32, skin_radius=0.5):
+    os.makedirs(directory, exist_ok=True)
+    bends, times = loadInput(input_path)
+    count = len(bends)
+    np.save(os.path.join(directory, "bends.npy"), np.asarray(bends, dtype=np.float32))
+    if times is not None:
+        np.save(os.path.join(directory, "times.npy"), np.asarray(times, dtype=np.float32))
+    if file_format == "npy":
+        # allocate the output files, the workers write into them:
+        shapes = getSampleShapes(n, m)
+        for name in outputs:
+            array = np.lib.format.open_memmap(os.path.join(directory, name + ".npy"), mode="w+",
+                                              dtype=np.float32, shape=(count,) + shapes[name])
+            del array
+
+    chunks = [(i, first, min(first + chunk_size, count))
+              for i, first in enumerate(range(0, count, chunk_size))]
+    parameters = (input_path, directory, outputs, file_format, n, r, m, skin_radius)
+    start = time.perf_counter()
+    if workers == 0:
+        # everything in this process:
+        initWorker(*parameters)
+        for chunk in chunks:
+            exportChunk(*chunk)
+    else:
+        with ProcessPoolExecutor(workers, initializer=initWorker, initargs=parameters) as pool:
+            futures = [pool.submit(exportChunk, *chunk) for chunk in chunks]
+            for future in futures:
+                future.result()
+    return count / max(time.perf_counter() - start, 1e-9)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export bones, transforms and skin of a sensor log")
+    parser.add_argument("input", help="recording, .npy bends (k) or .npy samples (k x 3)")
+    parser.add_argument("--output", default="export", help="output directory")
+    parser.add_argument("--outputs", default="bones,transforms",
+                        help="comma separated: " + ", ".join(OUTPUTS))
+    parser.add_argument("--format", default="npy", choices=["npy", "chunks"])
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of processes (default: all cores, 0 = no pool)")
+    parser.add_argument("--chunk-size", type=int, default=65536, help="samples per chunk")
+    parser.add_argument("--n", type=int, default=10, help="number of bones")
+    parser.add_argument("--m", type=int, default=32, help="number of ring vertices")
+    args = parser.parse_args()
+
+    outputs = tuple(name for name in args.outputs.split(",") if name)
+    for name in outputs:
+        if name not in OUTPUTS:
+            parser.error("unknown output: " + name)
+    rate = exportAll(args.input, args.output, outputs, args.format, args.workers,
+                     args.chunk_size, n=args.n, m=args.m)
+    print("Exported {} to {} -- samples/s: {:.0f}".format(", ".join(outputs), args.output, rate))
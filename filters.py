@@ -0,0 +1,253 @@
+import time
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+"""
+Streaming filters for the sensor samples before they select the pose and the
+colors. The samples come in blocks (k x (1 + channels): time, values...),
+each stage processes a whole block with NumPy and keeps what it needs of the
+block for the next one, so splitting a stream into other blocks gives the
+same output. The work per block is O(k) (times the window or filter length):
+
+outliers  -> OutlierRejection, a sample far from the median of the window
+             (Hampel filter) is replaced by the median
+median    -> MovingMedian of the last width samples
+decimate  -> Decimator, lowpass (windowed sinc) against aliasing, then every
+             factor-th sample
+ema       -> ExponentialAverage with a time constant
+
+The stages are chained with a FilterPipeline, e.g. from the option string:
+parseFilters("outliers:3,decimate:10,ema:0.02", rate=5000)
+All filters are causal, the filtered values lag behind the raw samples (the
+decimator by (taps - 1) / 2 samples, the average by about the time constant).
+"""
+class FilterPipeline():
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self.samples = 0 # number of processed input samples
+        self.seconds = 0.0 # time spent processing them
+
+    def process(self, samples):
+        """Filters the samples (k x (1 + channels)), returns the output samples"""
+        start = time.perf_counter()
+        samples = np.asarray(samples, dtype=np.float64)
+        times, values = samples[:, 0], samples[:, 1:]
+        for stage in self.stages:
+            times, values = stage.process(times, values)
+        self.samples += len(samples)
+        self.seconds += time.perf_counter() - start
+        return np.column_stack((times, values))
+
+    def __repr__(self):
+        cost = self.seconds / self.samples * 1e6 if self.samples else 0.0
+        return "Filters {} -- samples: {}, time per sample: {:.3f} us".format(
+                " -> ".join(repr(stage) for stage in self.stages), self.samples, cost)
+
+
+"""
+Returns the previous samples (history) followed by values, history is
+filled with the first value before the first block
+"""
+def extendHistory(history, values, size):
+    if history is None:
+        history = np.repeat(values[:1], size, axis=0)
+    return np.concatenate((history, values))
+
+
+"""
+Returns the windows (channels x k x width) of the last width samples of
+each of the k newest samples of values (history + k x channels), the
+channels first make each window contiguous
+"""
+def getWindows(values, width):
+    return sliding_window_view(np.ascontiguousarray(values.T), width, axis=-1)
+
+
+"""
+Median of each window (like np.median(windows, axis=-1), but np.partition
+without the copies of np.median is several times faster for short windows)
+"""
+def getMedian(windows):
+    width = windows.shape[-1]
+    middle = width // 2
+    if width % 2:
+        return np.partition(windows, middle, axis=-1)[..., middle]
+    parts = np.partition(windows, (middle - 1, middle), axis=-1)
+    return 0.5 * (parts[..., middle - 1] + parts[..., middle])
+
+
+class MovingMedian():
+
+    def __init__(self, width=5):
+        self.width = width
+        self.history = None
+
+    def process(self, times, values):
+        if not len(values):
+            return times, values
+        values = extendHistory(self.history, values, self.width - 1)
+        self.history = values[len(values) - (self.width - 1):]
+        return times, getMedian(getWindows(values, self.width)).T
+
+    def __repr__(self):
+        return "median({})".format(self.width)
+
+
+class OutlierRejection():
+    """
+    Hampel filter over the last width samples: a sample which is more than
+    threshold scaled median absolute deviations (at least minimum) away from
+    the median is replaced by the median
+    """
+
+    def __init__(self, threshold=3.0, width=7, minimum=1e-3):
+        self.threshold = threshold
+        self.width = width
+        self.minimum = minimum
+        self.history = None
+        self.rejected = 0
+
+    def process(self, times, values):
+        if not len(values):
+            return times, values
+        extended = extendHistory(self.history, values, self.width - 1)
+        self.history = extended[len(extended) - (self.width - 1):]
+        windows = getWindows(extended, self.width)
+        medians = getMedian(windows)
+        # 1.4826 * MAD estimates the standard deviation of normal noise:
+        deviations = 1.4826 * getMedian(np.abs(windows - medians[..., None]))
+        medians, deviations = medians.T, deviations.T
+        outliers = np.abs(values - medians) > self.threshold * np.maximum(deviations, self.minimum)
+        self.rejected += int(np.count_nonzero(outliers))
+        return times, np.where(outliers, medians, values)
+
+    def __repr__(self):
+        return "outliers({}, rejected: {})".format(self.threshold, self.rejected)
+
+
+class Decimator():
+    """
+    Keeps every factor-th sample, before the samples are lowpass filtered
+    (cutoff at the new Nyquist frequency), only the kept samples are computed
+    """
+
+    def __init__(self, factor=10, taps=None):
+        self.factor = factor
+        taps = taps or 4 * factor + 1
+        # windowed sinc, the gain at 0 Hz is 1:
+        n = np.arange(taps) - (taps - 1) / 2.0
+        h = np.sinc(n / factor) * np.hamming(taps)
+        self.h = h / h.sum()
+        self.history = None
+        self.count = 0 # number of input samples since the start
+
+    def process(self, times, values):
+        if not len(values):
+            return times, values
+        taps = len(self.h)
+        extended = extendHistory(self.history, values, taps - 1)
+        self.history = extended[len(extended) - (taps - 1):]
+        # the input samples with count % factor == 0:
+        kept = np.arange(-self.count % self.factor, len(values), self.factor)
+        self.count += len(values)
+        # window i ends with the input sample i:
+        windows = sliding_window_view(extended, taps, axis=0)[kept]
+        return times[kept], windows @ self.h[::-1]
+
+    def __repr__(self):
+        return "decimate({})".format(self.factor)
+
+
+class ExponentialAverage():
+    """
+    y[i] = (1 - alpha) * y[i - 1] + alpha * x[i] with alpha from the time
+    constant and the sample rate, the recursion is solved in closed form per
+    segment: y[i] = d^(i+1) * (y[-1] + alpha * sum_j<=i x[j] / d^(j+1)) with
+    d = 1 - alpha, the segments are short enough that 1 / d^(j+1) stays
+    below 1e6. With d below 1e-6 (e.g. time constant 0) the output is the
+    input
+    """
+
+    def __init__(self, time_constant, rate):
+        self.time_constant = time_constant
+        self.alpha = 1.0 - np.exp(-1.0 / max(time_constant * rate, 1e-9))
+        decay = 1.0 - self.alpha
+        # no powers for the pass-through:
+        self.powers = None
+        if decay > 1e-6:
+            segment = int(np.log(1e-6) / np.log(decay))
+            self.powers = decay ** np.arange(1, max(segment, 1) + 1)
+        self.state = None
+
+    def process(self, times, values):
+        if not len(values) or self.powers is None:
+            return times, values
+        if self.state is None:
+            self.state = values[0].copy()
+        output = np.empty_like(values)
+        segment = len(self.powers)
+        for start in range(0, len(values), segment):
+            x = values[start:start + segment]
+            powers = self.powers[:len(x), None]
+            y = powers * (self.state + self.alpha * np.cumsum(x / powers, axis=0))
+            output[start:start + segment] = y
+            self.state = y[-1]
+        return times, output
+
+    def __repr__(self):
+        return "ema({} s)".format(self.time_constant)
+
+
+"""
+Returns the FilterPipeline of an option string (see the top of this file),
+e.g. "outliers:3,median:5,decimate:10,ema:0.02", rate is the sample rate of
+the input in samples per second, the rate of the stages after a decimator
+is lower. None for an empty string or "none"
+"""
+def parseFilters(spec, rate):
+    if not spec or spec == "none":
+        return None
+    stages = []
+    for part in spec.split(","):
+        name, _, parameter = part.strip().partition(":")
+        if name == "outliers":
+            stages.append(OutlierRejection(float(parameter or 3.0)))
+        elif name == "median":
+            stages.append(MovingMedian(int(parameter or 5)))
+        elif name == "decimate":
+            stages.append(Decimator(int(parameter or 10)))
+            rate /= stages[-1].factor
+        elif name == "ema":
+            time_constant = float(parameter or 0.02)
+            if time_constant < 0.0:
+                raise ValueError("the time constant of ema must not be negative")
+            stages.append(ExponentialAverage(time_constant, rate))
+        else:
+            raise ValueError("unknown filter: " + name)
+    return FilterPipeline(stages)
+
+
+if __name__ == '__main__':
+    # cost of the filters for a stream of samples in blocks (one per frame):
+    import argparse
+    parser = argparse.ArgumentParser(description="Filter cost benchmark")
+    parser.add_argument("--filters", default="outliers:3,decimate:10,ema:0.02")
+    parser.add_argument("--rate", type=int, default=10000, help="samples per second")
+    parser.add_argument("--channels", type=int, default=2)
+    parser.add_argument("--fps", type=float, default=60.0, help="blocks per second")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    pipeline = parseFilters(args.filters, args.rate)
+    block = int(args.rate / args.fps)
+    total = int(args.seconds * args.rate)
+    t = np.arange(total) / args.rate
+    values = 0.5 - 0.5 * np.cos(2 * np.pi * 0.25 * t)[:, None] + 0.02 * np.random.randn(total, args.channels)
+    # some spikes:
+    values[np.random.randint(0, total, total // 1000)] += 1.0
+    samples = np.column_stack((t, values))
+    for first in range(0, total, block):
+        pipeline.process(samples[first:first + block])
+    print(pipeline)
+    print("CPU per second of input: {:.3%} of a core".format(pipeline.seconds / args.seconds))
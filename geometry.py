@@ -0,0 +1,161 @@
+import os
+import hashlib
+import numpy as np
+
+# stored in the cache, increase it whenever the layout of the arrays changes:
+GEOMETRY_VERSION = 1
+CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".geometry_cache")
+
+"""
+Number of points n (use linear interpolation for drawing)
+
+The initial state of the bending animation:
+b = r * 2*pi/4 (4th of a circle)
+----------------------------------------
+x, z = 0.0, 0.0
+for i in range(0, n): # (i = 0, 1,... n-1)
+    y = i * b/(n-1)
+----------------------------------------
+
+The final state of the bending animation:
+x = r * sin(t) + r
+y = r * cos(t)
+z = 0.0 (-> positive z-axis points out of screen)
+t = [3*pi/2, 2*pi] (4th of a circle)
+----------------------------------------
+r = 1
+t0 = 3*pi/2
+t1 = 2*pi
+for i in range(0, n):
+    t = t0 + i * (t1-t0)/(n-1)
+    x = r * sin(t) + r
+    y = r * cos(t)
+    z = 0.0
+----------------------------------------
+
+Returns:
+positions, colors and indices of the start (or end) points
+"""
+def createStartPoints(n, r, color):
+    b = r * 2*np.pi/4
+    y = np.arange(n) * (b/(n-1))
+    positions = np.zeros((n, 3))
+    positions[:, 1] = y
+    return positions, getColors(n, color), getBoneIndices(n)
+
+
+def createEndPoints(n, r, color):
+    t0, t1 = 3*np.pi/2, 2*np.pi
+    t = t0 + np.arange(n) * ((t1-t0)/(n-1))
+    positions = np.zeros((n, 3))
+    positions[:, 0] = r * np.sin(t) + r
+    positions[:, 1] = r * np.cos(t)
+    return positions, getColors(n, color), getBoneIndices(n)
+
+
+def getColors(count, color):
+    return np.tile(np.asarray(color, dtype=np.float32), (count, 1))
+
+
+def getBoneIndices(n):
+    i = np.arange(n, dtype=np.uint32)
+    # e.g. n = 10 -> indices for GL_LINE_STRIP: 0, 1, 1, 2, 2, 3,... 7, 8, 8, 9
+    line_strip = np.repeat(i, 2)[1:-1]
+    # e.g. n = 10 -> indices for GL_POINTS: 0, 1, 2,... 8, 9
+    return np.concatenate((line_strip, i))
+
+
+"""
+With the bones of the actuator we need the mantle, therefore
+create 2 circles with origins centered in local space!
+(the circles are in the x, z plane due to our coordinate system where the y-axis is up)
+
+Indices in the positions list:
+|<------circle1------>| |<------circle2----->|
+[p_0, p_1, p_2,... p_n, p_0, p_1, p_2,... p_n] (p_0 is the cirlce center)
+  0,   1,   2,...   n,  n+1, n+2, n+3,... 2n+1 <--- these are the indices
+in the positions list!
+
+GL_TRIANGLE_FAN is used for the area...
+Cirlce1 -> for the area: 0,... n, 1
+Cirlce2 -> for the area: n+1,... 2n+1, n+2
+
+GL_LINE_LOOP is used for the line...
+Cirlce1 -> for the line: 1,... n
+Cirlce2 -> for the line: n+2,... 2n+1
+
+GL_TRIANGLE_STRIP is used for the mantle...
+Cylinder mantle: 1, n+2, 2, n+3,... n, 2*n+1, 1, n+2 (p_0's aren't used)
+
+In the actual code n is reserved, use m instead!!!!!!!
+
+This is how to draw from the indices buffer then:
+Cirlce1 -> for the area:
+mode: GL_TRIANGLE_FAN, size: m + 2, offset: 0
+Cirlce2 -> for the area:
+mode: GL_TRIANGLE_FAN, size: m + 2, offset: m + 2
+(note: next offset is always previous offset + previous size)
+Cirlce1 -> for the line:
+mode: GL_LINE_LOOP, size: m, offset: 2 * m + 4
+Cirlce2 -> for the line:
+mode: GL_LINE_LOOP, size: m, offset: 3 * m + 4
+
+Cylinder mantle (therefore we need both circles in one VAO):
+note: circle1 needs to be the top and circle2 the bottom of the mantle!
+mode: GL_TRIANGLE_STRIP, size: 2 * m + 2, offset: 4 * m + 4
+
+Returns:
+positions, colors and indices of the skin mesh
+"""
+def createCylinder(m, r, color):
+    # exactly m vertices per circle (phi = 0,... 360 - 360/m degrees):
+    phi = np.arange(m) * (2*np.pi/m)
+    circle = np.zeros((m + 1, 3), dtype=np.float32) # the circle center first
+    circle[1:, 0] = r * np.cos(phi)
+    circle[1:, 2] = r * np.sin(phi)
+    positions = np.concatenate((circle, circle))
+
+    circle1 = np.arange(1, m + 1, dtype=np.uint32) # 1,... m
+    circle2 = circle1 + m + 1 # m + 2,... 2 * m + 1
+    indices = np.concatenate((
+        # Cirlce1 -> for the area (closed with 1):
+        [0], circle1, [1],
+        # Cirlce2 -> for the area (closed with m + 2):
+        [m + 1], circle2, [m + 2],
+        # Cirlce1 and Cirlce2 -> for the line:
+        circle1, circle2,
+        # Cylinder mantle (closed with 1, m + 2):
+        np.stack((circle1, circle2), axis=1).ravel(), [1, m + 2])).astype(np.uint32)
+
+    return positions, getColors(2 * m + 2, color), indices
+
+
+"""
+Returns positions, colors and indices of builder(**parameters) (e.g.
+createCylinder) from the .npz cache in cache_directory, the geometry is
+created and stored if it isn't cached yet (or was cached by another
+GEOMETRY_VERSION)
+"""
+def getCached(builder, cache_directory=CACHE_DIRECTORY, **parameters):
+    key = repr((builder.__name__, GEOMETRY_VERSION, sorted(parameters.items())))
+    filename = "{}-{}.npz".format(builder.__name__, hashlib.sha1(key.encode()).hexdigest()[:16])
+    path = os.path.join(cache_directory, filename)
+    try:
+        with np.load(path) as data:
+            if int(data["version"]) == GEOMETRY_VERSION:
+                return data["positions"], data["colors"], data["indices"]
+    except (OSError, KeyError, ValueError):
+        pass
+
+    positions, colors, indices = builder(**parameters)
+    try:
+        os.makedirs(cache_directory, exist_ok=True)
+        # write a temporary file first, another process may read the cache:
+        temporary = path + ".{}.tmp".format(os.getpid())
+        with open(temporary, "wb") as file:
+            np.savez(file, version=GEOMETRY_VERSION, positions=positions,
+                     colors=colors, indices=indices)
+        os.replace(temporary, path)
+    except OSError:
+        pass # the cache is optional
+    return positions, colors, indices
@@ -0,0 +1,138 @@
+import ctypes
+import numpy as np
+from OpenGL.GL import *
+
+"""
+Offscreen rendering without a window or a display, e.g. on CI machines
+without a GPU (Mesa's software rasterizer llvmpipe):
+egl    -> EGL pbuffer context (Mesa: EGL_PLATFORM=surfaceless)
+osmesa -> OSMesa context
+
+PyOpenGL binds to the backend which is set in the PYOPENGL_PLATFORM
+environment variable when OpenGL is imported for the first time, so set it
+to the backend before importing any module which uses OpenGL (see main.py).
+"""
+def createContext(width, height, backend):
+    if backend == "egl":
+        return EGLContext(width, height)
+    if backend == "osmesa":
+        return OSMesaContext(width, height)
+    raise ValueError("unknown offscreen backend: {}".format(backend))
+
+
+class EGLContext():
+
+    def __init__(self, width, height):
+        from OpenGL import EGL
+        self.EGL = EGL
+        self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        if not EGL.eglInitialize(self.display, ctypes.pointer(major), ctypes.pointer(minor)):
+            raise RuntimeError("eglInitialize failed")
+
+        config_attribs = [EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+                          EGL.EGL_RED_SIZE, 8,
+                          EGL.EGL_GREEN_SIZE, 8,
+                          EGL.EGL_BLUE_SIZE, 8,
+                          EGL.EGL_DEPTH_SIZE, 24,
+                          EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+                          EGL.EGL_NONE]
+        config_attribs = (EGL.EGLint * len(config_attribs))(*config_attribs)
+        config = EGL.EGLConfig()
+        count = EGL.EGLint()
+        EGL.eglChooseConfig(self.display, config_attribs, ctypes.pointer(config), 1, ctypes.pointer(count))
+        if count.value == 0:
+            raise RuntimeError("no EGL config for offscreen OpenGL rendering")
+
+        surface_attribs = [EGL.EGL_WIDTH, width, EGL.EGL_HEIGHT, height, EGL.EGL_NONE]
+        surface_attribs = (EGL.EGLint * len(surface_attribs))(*surface_attribs)
+        self.surface = EGL.eglCreatePbufferSurface(self.display, config, surface_attribs)
+
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        context_attribs = [EGL.EGL_CONTEXT_MAJOR_VERSION, 3,
+                           EGL.EGL_CONTEXT_MINOR_VERSION, 3,
+                           EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+                           EGL.EGL_NONE]
+        context_attribs = (EGL.EGLint * len(context_attribs))(*context_attribs)
+        self.context = EGL.eglCreateContext(self.display, config, EGL.EGL_NO_CONTEXT, context_attribs)
+        if not self.context:
+            raise RuntimeError("eglCreateContext failed")
+        EGL.eglMakeCurrent(self.display, self.surface, self.surface, self.context)
+
+    def destroy(self):
+        EGL = self.EGL
+        EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        EGL.eglDestroyContext(self.display, self.context)
+        EGL.eglDestroySurface(self.display, self.surface)
+        EGL.eglTerminate(self.display)
+
+
+class OSMesaContext():
+
+    def __init__(self, width, height):
+        from OpenGL import osmesa
+        self.osmesa = osmesa
+        attribs = [osmesa.OSMESA_FORMAT, osmesa.OSMESA_RGBA,
+                   osmesa.OSMESA_DEPTH_BITS, 24,
+                   osmesa.OSMESA_PROFILE, osmesa.OSMESA_CORE_PROFILE,
+                   osmesa.OSMESA_CONTEXT_MAJOR_VERSION, 3,
+                   osmesa.OSMESA_CONTEXT_MINOR_VERSION, 3,
+                   0]
+        self.context = osmesa.OSMesaCreateContextAttribs(attribs, None)
+        if not self.context:
+            raise RuntimeError("OSMesaCreateContextAttribs failed")
+        # OSMesa renders the default framebuffer into this memory:
+        self.buffer = np.zeros((height, width, 4), dtype=np.uint8)
+        osmesa.OSMesaMakeCurrent(self.context, self.buffer, GL_UNSIGNED_BYTE, width, height)
+
+    def destroy(self):
+        self.osmesa.OSMesaDestroyContext(self.context)
+
+
+class Framebuffer():
+    """Framebuffer object with a color and a depth renderbuffer"""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.id = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.id)
+
+        self.color = glGenRenderbuffers(1)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.color)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, width, height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.color)
+
+        self.depth = glGenRenderbuffers(1)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.depth)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, width, height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, self.depth)
+
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError("framebuffer is not complete")
+        glBindRenderbuffer(GL_RENDERBUFFER, 0)
+
+    def bind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.id)
+
+    def destroy(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, 0)
+        glDeleteRenderbuffers(2, [self.color, self.depth])
+        glDeleteFramebuffers(1, [self.id])
+
+
+"""
+Input:
+The latencies of the rendered frames in seconds
+
+Returns:
+frames/s and the percentiles of the latency in milliseconds
+"""
+def getThroughput(latencies):
+    latencies = np.asarray(latencies)
+    report = {"frames": len(latencies),
+              "fps": len(latencies) / latencies.sum()}
+    for q in (50, 90, 99):
+        report["p{}_ms".format(q)] = np.percentile(latencies, q) * 1000.0
+    report["max_ms"] = latencies.max() * 1000.0
+    return report
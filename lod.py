@@ -0,0 +1,95 @@
+import numpy as np
+
+"""
+Level of detail of the actuator skin. There are two independent choices:
+
+- ring resolution m (vertices per ring): a ring of radius r drawn as m-gon
+  is off by at most r * (1 - cos(pi/m)) (see getRingError)
+- ring density k (rings per actuator): only k of the n rings are drawn, the
+  mantle goes straight from one drawn ring to the next. The rings are chosen
+  per pose (see selectRings), where the actuator bends strongly more of them
+  are kept, the error is the largest distance of a left out bone from the
+  straight line between its drawn neighbours
+
+Both errors are in world units, multiplied with the pixels per world unit at
+the distance of the actuator (see getPixelScale) they are compared with a
+pixel threshold and the cheapest level below it is chosen (see chooseLevel).
+"""
+def getRingError(m, r):
+    return r * (1.0 - np.cos(np.pi / m))
+
+
+"""
+Input:
+poses (poses x n x 3) and the number of rings k (2,... n)
+
+Returns:
+the indices of the kept rings (poses x k, ascending, the first and the last
+ring are always kept) and the error of each pose (poses)
+"""
+def selectRings(poses, k):
+    poses = np.asarray(poses, dtype=np.float64)
+    count, n, _ = poses.shape
+    bones = np.arange(n)
+    kept = np.zeros((count, n), dtype=bool)
+    kept[:, [0, n - 1]] = True
+    rows = np.arange(count)
+    # add the bone which is farthest from the current polyline until k are kept:
+    for _ in range(k - 2):
+        distances = getPolylineDistances(poses, kept, bones)
+        # a straight pose has no error at all, a new ring is needed anyway:
+        distances[kept] = -1.0
+        kept[rows, np.argmax(distances, axis=1)] = True
+    errors = getPolylineDistances(poses, kept, bones).max(axis=1)
+    indices = np.nonzero(kept)[1].reshape(count, k)
+    return indices, errors
+
+
+"""
+Returns the distances (poses x n) of the bones from the polyline through the
+kept bones (0 for the kept bones)
+"""
+def getPolylineDistances(poses, kept, bones):
+    # the nearest kept bone before and after each bone:
+    before = np.maximum.accumulate(np.where(kept, bones, 0), axis=1)
+    after = np.minimum.accumulate(np.where(kept, bones, bones[-1])[:, ::-1], axis=1)[:, ::-1]
+    a = np.take_along_axis(poses, before[..., None], axis=1)
+    b = np.take_along_axis(poses, after[..., None], axis=1)
+    ab = b - a
+    lengths = np.maximum(np.sum(ab * ab, axis=-1), 1e-12)
+    t = np.clip(np.sum((poses - a) * ab, axis=-1) / lengths, 0.0, 1.0)
+    distances = np.linalg.norm(a + t[..., None] * ab - poses, axis=-1)
+    return np.where(kept, 0.0, distances)
+
+
+"""
+Returns the pixels per world unit at the given distances for a perspective
+projection (fov_y in degrees) with a viewport of height pixels
+"""
+def getPixelScale(distances, fov_y, height):
+    focal = height / (2.0 * np.tan(np.radians(fov_y) / 2.0))
+    return focal / np.maximum(distances, 1e-3)
+
+
+"""
+Input:
+errors (... x levels) in world units of each level from the cheapest to the
+finest, scale (...) in pixels per world unit
+
+Returns:
+the cheapest level with an error of at most threshold pixels, the finest
+level if none is good enough
+"""
+def chooseLevel(errors, scale, threshold):
+    good = errors * scale[..., None] <= threshold
+    # the finest level is always allowed:
+    good[..., -1] = True
+    return np.argmax(good, axis=-1)
+
+
+"""
+Returns the number of vertices processed to draw one skin with m vertices
+per ring and k rings (mantle, caps and ring lines, see Skin.draw)
+"""
+def getSkinVertices(m, k):
+    return (k - 1) * (2 * m + 2) + 2 * (m + 2) + k * m
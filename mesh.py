@@ -1,13 +1,41 @@
 from OpenGL.GL import *
+import ctypes
 from ctypes import c_void_p
 import numpy as np
 
 class Mesh():
+    """
+    With dynamic_colors the positions and the colors are stored in separate
+    buffers and the colors can be changed with updateColors, color_update
+    selects how the color buffer is updated:
+    "subdata"    -> glBufferSubData of the changed range (default)
+    "orphan"     -> glBufferData(None) + glBufferSubData of all colors, the
+                    driver doesn't have to wait for draw calls which still
+                    use the old data, but the contents of the new storage
+                    are undefined, so every update uploads the whole buffer
+    "persistent" -> persistently mapped ring of 3 color buffer sections,
+                    synchronized with fences (needs glBufferStorage, falls
+                    back to "subdata" otherwise)
 
-    def __init__(self, positions, colors, indices):
+    With a pool (GeometryPool, not with dynamic_colors) the vertices and
+    indices are sub-allocated from its buffers instead of own buffers.
+    delete frees the GPU resources (or releases the ranges of the pool).
+    """
+
+    # number of draw calls of all meshes (reset by the caller, e.g. per frame):
+    draw_calls = 0
+    # number of meshes which aren't deleted:
+    live = 0
+
+    def __init__(self, positions, colors, indices, dynamic_colors=False,
+                 color_update="subdata", pool=None):
         self.positions = positions
         self.colors = colors
         self.indices = indices
+        self.dynamic_colors = dynamic_colors
+        self.pool = pool if not dynamic_colors else None
+        self.mapped = None
+        Mesh.live += 1
 
         # use numpy to structure the data (memory layout is sequential):
         data = np.zeros(len(positions), [("position", np.float32, 3),
@@ -21,45 +49,298 @@ class Mesh():
         self.indices = indices
         # vartex array object:
         self.VAO = glGenVertexArrays(1)
-        glBindVertexArray(self.VAO)
 
-        # vertex buffer object:
-        self.VBO = glGenBuffers(1)
-        glBindBuffer(GL_ARRAY_BUFFER, self.VBO)
-        glBufferData(GL_ARRAY_BUFFER, self.data.nbytes, self.data, GL_STATIC_DRAW)
+        if self.pool is not None:
+            # number of bytes to go from one vertex to the next:
+            self.stride = self.data.strides[0]
+            self.vertex_allocation = self.pool.vertices.allocate(self.data.nbytes, owner=self)
+            self.pool.vertices.upload(self.vertex_allocation, self.data)
+            self.index_allocation = self.pool.indices.allocate(self.indices.nbytes, owner=self)
+            self.pool.indices.upload(self.index_allocation, self.indices)
+            self.relocate()
+            return
+
+        glBindVertexArray(self.VAO)
 
         # element buffer object:
         self.EBO = glGenBuffers(1)
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.EBO)
         glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, GL_STATIC_DRAW)
 
-        # number of bytes to go from one vertex to the next:
-        self.stride = self.data.strides[0]
-        # using np.float32 for both position and color:
-        # self.stride = 3 * 4 + 4 * 4 because 3 values for position each 4 bytes
-        # and 4 values for color each 4 bytes!
+        if dynamic_colors:
+            self.createColorStream(color_update)
+        else:
+            # vertex buffer object:
+            self.VBO = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, self.VBO)
+            glBufferData(GL_ARRAY_BUFFER, self.data.nbytes, self.data, GL_STATIC_DRAW)
 
-        # positions:
-        offset = c_void_p(0)
-        glEnableVertexAttribArray(0) # layout(location = 0)
-        glVertexAttribPointer(0, 3, GL_FLOAT, False, self.stride, offset)
-        # colors:
-        offset = c_void_p(self.data.dtype["position"].itemsize) # OFFSET IS ALWAYS IN BYTES
-        glEnableVertexAttribArray(1) # layout(location = 1)
-        glVertexAttribPointer(1, 4, GL_FLOAT, False, self.stride, offset)
+            # number of bytes to go from one vertex to the next:
+            self.stride = self.data.strides[0]
+            # using np.float32 for both position and color:
+            # self.stride = 3 * 4 + 4 * 4 because 3 values for position each 4 bytes
+            # and 4 values for color each 4 bytes!
+
+            # positions:
+            offset = c_void_p(0)
+            glEnableVertexAttribArray(0) # layout(location = 0)
+            glVertexAttribPointer(0, 3, GL_FLOAT, False, self.stride, offset)
+            # colors:
+            offset = c_void_p(self.data.dtype["position"].itemsize) # OFFSET IS ALWAYS IN BYTES
+            glEnableVertexAttribArray(1) # layout(location = 1)
+            glVertexAttribPointer(1, 4, GL_FLOAT, False, self.stride, offset)
 
         # unbind buffers:
         glBindVertexArray(0)
         glBindBuffer(GL_ARRAY_BUFFER, 0)
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
 
+    def relocate(self):
+        """Points the VAO to the ranges of the pool (after allocation or compaction)"""
+        glBindVertexArray(self.VAO)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_allocation.buffer)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_allocation.buffer)
+        base = self.vertex_allocation.offset
+        glEnableVertexAttribArray(0) # layout(location = 0)
+        glVertexAttribPointer(0, 3, GL_FLOAT, False, self.stride, c_void_p(base))
+        glEnableVertexAttribArray(1) # layout(location = 1)
+        glVertexAttribPointer(1, 4, GL_FLOAT, False, self.stride,
+                              c_void_p(base + self.data.dtype["position"].itemsize))
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def getIndexOffset(self, offset):
+        """Returns the byte offset of the index offset in the bound EBO"""
+        base = self.index_allocation.offset if self.pool is not None else 0
+        return c_void_p(base + offset * self.indices.itemsize) # OFFSET IS ALWAYS IN BYTES
+
+    def delete(self):
+        """Frees the buffers and the VAO, the mesh can't be drawn anymore"""
+        if self.VAO is None:
+            return
+        if self.pool is not None:
+            self.pool.vertices.release(self.vertex_allocation)
+            self.pool.indices.release(self.index_allocation)
+        else:
+            buffers = [self.VBO, self.EBO]
+            if self.dynamic_colors:
+                if self.mapped is not None:
+                    glBindBuffer(GL_ARRAY_BUFFER, self.colorVBO)
+                    glUnmapBuffer(GL_ARRAY_BUFFER)
+                    glBindBuffer(GL_ARRAY_BUFFER, 0)
+                    self.mapped = None
+                    for fence in self.fences:
+                        if fence is not None:
+                            glDeleteSync(fence)
+                buffers.append(self.colorVBO)
+            glDeleteBuffers(len(buffers), buffers)
+        glDeleteVertexArrays(1, [self.VAO])
+        self.VAO = None
+        Mesh.live -= 1
+
+    def createColorStream(self, color_update):
+        """Separate position and color buffers (the VAO must be bound)"""
+        # positions (static):
+        positions = np.ascontiguousarray(self.data["position"])
+        self.VBO = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.VBO)
+        glBufferData(GL_ARRAY_BUFFER, positions.nbytes, positions, GL_STATIC_DRAW)
+        glEnableVertexAttribArray(0) # layout(location = 0)
+        glVertexAttribPointer(0, 3, GL_FLOAT, False, 0, c_void_p(0))
+
+        # CPU copy of the colors, changed ranges are uploaded from here:
+        self.color_data = np.ascontiguousarray(self.data["color"])
+        self.color_bytes = self.color_data.nbytes
+        if color_update == "persistent" and not bool(glBufferStorage):
+            color_update = "subdata"
+        self.color_update = color_update
+
+        self.colorVBO = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.colorVBO)
+        if color_update == "persistent":
+            # 3 sections: while the GPU draws with one section the next can
+            # be written without waiting:
+            self.sections = 3
+            self.section = 0
+            self.fences = [None] * self.sections
+            flags = GL_MAP_WRITE_BIT | GL_MAP_PERSISTENT_BIT | GL_MAP_COHERENT_BIT
+            size = self.sections * self.color_bytes
+            glBufferStorage(GL_ARRAY_BUFFER, size, None, flags)
+            pointer = glMapBufferRange(GL_ARRAY_BUFFER, 0, size, flags)
+            pointer = ctypes.cast(pointer, ctypes.POINTER(ctypes.c_float))
+            self.mapped = np.ctypeslib.as_array(pointer,
+                    shape=(self.sections,) + self.color_data.shape)
+            self.mapped[0] = self.color_data
+        else:
+            glBufferData(GL_ARRAY_BUFFER, self.color_bytes, self.color_data, GL_DYNAMIC_DRAW)
+        glEnableVertexAttribArray(1) # layout(location = 1)
+        glVertexAttribPointer(1, 4, GL_FLOAT, False, 0, c_void_p(0))
+
+    def updateColors(self, colors, start=0):
+        """
+        Changes the colors (k x 4) of the vertices start,... start + k - 1,
+        only possible with dynamic_colors
+        """
+        colors = np.asarray(colors, dtype=np.float32).reshape(-1, 4)
+        end = start + len(colors)
+        self.color_data[start:end] = colors
+        glBindBuffer(GL_ARRAY_BUFFER, self.colorVBO)
+        if self.color_update == "subdata":
+            glBufferSubData(GL_ARRAY_BUFFER, start * 16, colors.nbytes, self.color_data[start:end])
+        elif self.color_update == "orphan":
+            # the old storage is released once the GPU doesn't need it anymore:
+            glBufferData(GL_ARRAY_BUFFER, self.color_bytes, None, GL_DYNAMIC_DRAW)
+            glBufferSubData(GL_ARRAY_BUFFER, 0, self.color_bytes, self.color_data)
+        else:
+            # the draw calls of the current section are finished when its
+            # fence is signaled:
+            self.fences[self.section] = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+            self.section = (self.section + 1) % self.sections
+            fence = self.fences[self.section]
+            if fence is not None:
+                glClientWaitSync(fence, GL_SYNC_FLUSH_COMMANDS_BIT, 1000000000)
+                glDeleteSync(fence)
+                self.fences[self.section] = None
+            self.mapped[self.section] = self.color_data
+            # let the color attribute point to the new section:
+            glBindVertexArray(self.VAO)
+            glVertexAttribPointer(1, 4, GL_FLOAT, False, 0, c_void_p(self.section * self.color_bytes))
+            glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
     def draw(self, mode, size, offset):
         # bind the VAO, it contains all info about the buffers and attributes:
         glBindVertexArray(self.VAO)
         # to calculate the offset in bytes as required:
-        offset = c_void_p(offset * self.indices.itemsize) # OFFSET IS ALWAYS IN BYTES
+        offset = self.getIndexOffset(offset)
         # draw the data with the help of the indices:
         glDrawElements(mode, size, GL_UNSIGNED_INT, offset)
+        Mesh.draw_calls += 1
+
+    def drawInstanced(self, mode, size, offset, instances):
+        glBindVertexArray(self.VAO)
+        offset = self.getIndexOffset(offset)
+        # the shader tells the instances apart with gl_InstanceID:
+        glDrawElementsInstanced(mode, size, GL_UNSIGNED_INT, offset, instances)
+        Mesh.draw_calls += 1
 
     def __repr__(self):
         return "data:\n{}\nindices:\n{}\n".format(self.data, self.indices)
+
+
+class PoseAtlas():
+    """
+    All poses of an animation in one vertex buffer (back to back) together with
+    one shared color and one shared index buffer, the pose is selected by
+    the offset of the position attribute when drawing
+    """
+
+    def __init__(self, pose_positions, colors, indices, pool=None):
+        # (poses x vertices x 3), the memory layout is sequential:
+        self.pose_positions = np.ascontiguousarray(pose_positions, dtype=np.float32)
+        self.colors = np.array(colors, dtype=np.float32)
+        self.indices = np.array(indices, dtype=np.uint32)
+        self.pose_count = self.pose_positions.shape[0]
+        # number of bytes to go from one pose to the next:
+        self.pose_stride = self.pose_positions[0].nbytes
+        self.pool = pool
+        Mesh.live += 1
+
+        self.VAO = glGenVertexArrays(1)
+        if pool is not None:
+            # the positions of all poses, the colors and the indices are
+            # ranges in the buffers of the pool:
+            self.allocations = [pool.vertices.allocate(self.pose_positions.nbytes, owner=self),
+                                pool.vertices.allocate(self.colors.nbytes, owner=self),
+                                pool.indices.allocate(self.indices.nbytes, owner=self)]
+            pool.vertices.upload(self.allocations[0], self.pose_positions)
+            pool.vertices.upload(self.allocations[1], self.colors)
+            pool.indices.upload(self.allocations[2], self.indices)
+            self.relocate()
+            return
+
+        # colors (shared by all poses):
+        self.colorVBO = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.colorVBO)
+        glBufferData(GL_ARRAY_BUFFER, self.colors.nbytes, self.colors, GL_STATIC_DRAW)
+
+        # positions of all poses:
+        self.positionVBO = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.positionVBO)
+        glBufferData(GL_ARRAY_BUFFER, self.pose_positions.nbytes, self.pose_positions, GL_DYNAMIC_DRAW)
+
+        # element buffer object (shared by all poses):
+        self.EBO = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.EBO)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+        # byte offsets of the positions, colors and indices in their buffers:
+        self.position_base = self.color_base = self.index_base = 0
+        self.setAttributes()
+
+    def relocate(self):
+        """Points the VAO to the ranges of the pool (after allocation or compaction)"""
+        positions, colors, indices = self.allocations
+        self.positionVBO, self.position_base = positions.buffer, positions.offset
+        self.colorVBO, self.color_base = colors.buffer, colors.offset
+        self.EBO, self.index_base = indices.buffer, indices.offset
+        self.setAttributes()
+
+    def setAttributes(self):
+        glBindVertexArray(self.VAO)
+        glBindBuffer(GL_ARRAY_BUFFER, self.colorVBO)
+        glEnableVertexAttribArray(1) # layout(location = 1)
+        glVertexAttribPointer(1, 4, GL_FLOAT, False, 0, c_void_p(self.color_base))
+        glBindBuffer(GL_ARRAY_BUFFER, self.positionVBO)
+        glEnableVertexAttribArray(0) # layout(location = 0)
+        glVertexAttribPointer(0, 3, GL_FLOAT, False, 0, c_void_p(self.position_base))
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.EBO)
+
+        # unbind buffers:
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def setPose(self, pose_nr, positions):
+        """Replaces the positions of one pose"""
+        self.pose_positions[pose_nr] = positions
+        glBindBuffer(GL_ARRAY_BUFFER, self.positionVBO)
+        glBufferSubData(GL_ARRAY_BUFFER, self.position_base + pose_nr * self.pose_stride,
+                        self.pose_stride, self.pose_positions[pose_nr])
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def updateColors(self, colors):
+        """Changes the colors of all poses at once"""
+        self.colors[:] = colors
+        glBindBuffer(GL_ARRAY_BUFFER, self.colorVBO)
+        glBufferSubData(GL_ARRAY_BUFFER, self.color_base, self.colors.nbytes, self.colors)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self, pose_nr, mode, size, offset):
+        glBindVertexArray(self.VAO)
+        # let the position attribute point to the positions of the pose:
+        glBindBuffer(GL_ARRAY_BUFFER, self.positionVBO)
+        glVertexAttribPointer(0, 3, GL_FLOAT, False, 0,
+                              c_void_p(self.position_base + pose_nr * self.pose_stride))
+        offset = c_void_p(self.index_base + offset * self.indices.itemsize) # OFFSET IS ALWAYS IN BYTES
+        glDrawElements(mode, size, GL_UNSIGNED_INT, offset)
+        Mesh.draw_calls += 1
+
+    def delete(self):
+        """Frees the buffers and the VAO (or releases the ranges of the pool)"""
+        if self.VAO is None:
+            return
+        if self.pool is not None:
+            positions, colors, indices = self.allocations
+            self.pool.vertices.release(positions)
+            self.pool.vertices.release(colors)
+            self.pool.indices.release(indices)
+        else:
+            glDeleteBuffers(3, [self.positionVBO, self.colorVBO, self.EBO])
+        glDeleteVertexArrays(1, [self.VAO])
+        self.VAO = None
+        Mesh.live -= 1
+
+    def __repr__(self):
+        return "poses: {}\ncolors:\n{}\nindices:\n{}\n".format(
+                self.pose_count, self.colors, self.indices)
@@ -0,0 +1,308 @@
+import math
+import numpy as np
+
+"""
+Ray picking of the bones (segments between neighbouring rings) of many
+actuators with a bounding volume hierarchy (SegmentBVH).
+
+Each segment is a capsule of the skin radius around the bone from ring i to
+ring i + 1. The segments are sorted once along a Morton curve of their
+centers (build), neighbouring segments in this order form the leaves of
+leaf_size segments and the leaves are the bottom level of a complete binary
+tree (node j of a level has the children 2j and 2j + 1 in the next level).
+
+When the bends change the segments move, but stay close to their
+neighbours, so the order is kept and only the boxes are recomputed (refit):
+the leaf boxes from the segments and every level from the level below, a
+few NumPy reductions over all segments. If only some segments moved, only
+their boxes and the boxes above them are recomputed. A rebuild is only
+needed if the segments themselves change (e.g. another number of actuators).
+
+A pick goes down the tree three levels at a time (one Python step per
+three levels, the boxes of all nodes which the ray may hit are tested at
+once), the segments of the hit leaves are tested exactly (distance between
+the ray and the segment). python picking.py measures build, refit and pick
+for 100k segments.
+"""
+class SegmentBVH():
+
+    def __init__(self, starts, ends, radius, leaf_size=8):
+        starts = np.asarray(starts, dtype=np.float32)
+        ends = np.asarray(ends, dtype=np.float32)
+        if leaf_size & (leaf_size - 1):
+            raise ValueError("the leaf size must be a power of 2")
+        self.radius = radius
+        self.leaf_size = leaf_size
+        self.count = len(starts)
+        leaves = max(-(-self.count // leaf_size), 1)
+        self.depth = int(math.ceil(math.log2(leaves)))
+        # the leaves of the complete tree (the last ones are empty):
+        self.size = 2**self.depth * leaf_size
+        self.order = np.argsort(getMortonCodes(0.5 * (starts + ends)), kind="stable")
+        # the position of each segment in the order:
+        self.ranks = np.empty_like(self.order)
+        self.ranks[self.order] = np.arange(self.count)
+        self.starts = np.zeros((self.size, 3), dtype=np.float32)
+        self.ends = np.zeros((self.size, 3), dtype=np.float32)
+        # a box is (lower, -upper), so one np.minimum merges boxes, the
+        # padding boxes are empty:
+        self.boxes = np.full((self.size, 6), np.inf, dtype=np.float32)
+        # level 0 is the root, level depth the leaves:
+        self.bounds = [np.empty((2**level, 6), dtype=np.float32) for level in range(self.depth + 1)]
+        # a pick tests every third level (8 children per node), from the leaves up:
+        self.levels = list(range(self.depth, -1, -3))[::-1]
+        # the nodes with segments come first in each level, the padding nodes
+        # after them are left out of the traversal:
+        self.filled = [-(-self.count // (leaf_size * 2**(self.depth - level)))
+                       for level in range(self.depth + 1)]
+        self.refit(starts, ends)
+
+    def refit(self, starts, ends, segments=None):
+        """
+        Updates the boxes of the moved segments: all segments (the same as at
+        the build) or only the given segments (numbers as given at the build,
+        starts and ends of these segments), then only the boxes above them
+        """
+        if segments is None:
+            self.starts[:self.count] = np.asarray(starts)[self.order]
+            self.ends[:self.count] = np.asarray(ends)[self.order]
+            self.setBoxes(slice(0, self.count))
+            # halve the segments of each leaf until one box per leaf is left:
+            boxes = self.boxes
+            while len(boxes) > len(self.bounds[-1]):
+                boxes = np.minimum(boxes[0::2], boxes[1::2])
+            self.bounds[-1][:] = boxes
+            for level in range(self.depth - 1, -1, -1):
+                np.minimum(self.bounds[level + 1][0::2], self.bounds[level + 1][1::2],
+                           out=self.bounds[level])
+            return
+        positions = self.ranks[segments]
+        self.starts[positions] = starts
+        self.ends[positions] = ends
+        self.setBoxes(positions)
+        nodes = np.unique(positions // self.leaf_size)
+        self.bounds[-1][nodes] = self.boxes.reshape(-1, self.leaf_size, 6)[nodes].min(axis=1)
+        for level in range(self.depth - 1, -1, -1):
+            nodes = np.unique(nodes // 2)
+            children = self.bounds[level + 1]
+            self.bounds[level][nodes] = np.minimum(children[2 * nodes], children[2 * nodes + 1])
+
+    def setBoxes(self, positions):
+        starts, ends = self.starts[positions], self.ends[positions]
+        self.boxes[positions, :3] = np.minimum(starts, ends) - self.radius
+        self.boxes[positions, 3:] = np.minimum(-starts, -ends) - self.radius
+
+    def intersect(self, origin, direction):
+        """
+        Returns the segment (number as given at the build), the distance along
+        the ray and the position on the segment (0.0 = start,... 1.0 = end) of
+        the nearest hit or None
+        """
+        origin = np.asarray(origin, dtype=np.float32)
+        direction = np.asarray(direction, dtype=np.float32)
+        direction = direction / np.linalg.norm(direction)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # the slabs of (lower, -upper):
+            inverse = np.concatenate((1.0 / direction, -1.0 / direction))
+            offset = np.concatenate((origin, -origin))
+            nodes = np.arange(self.filled[self.levels[0]])
+            for level, next_level in zip(self.levels, self.levels[1:] + [None]):
+                # slab test of all boxes of the level at once:
+                t = (self.bounds[level][nodes] - offset) * inverse
+                # (the reductions over the 3 axes are faster written out):
+                near = np.fmin(t[:, :3], t[:, 3:])
+                far = np.fmax(t[:, :3], t[:, 3:])
+                near = np.fmax(np.fmax(near[:, 0], near[:, 1]), np.fmax(near[:, 2], 0.0))
+                far = np.fmin(np.fmin(far[:, 0], far[:, 1]), far[:, 2])
+                nodes = nodes[near <= far]
+                if not len(nodes):
+                    return None
+                if next_level is not None:
+                    children = 2**(next_level - level)
+                    nodes = (children * nodes[:, None] + np.arange(children)).ravel()
+                    nodes = nodes[nodes < self.filled[next_level]]
+        candidates = (nodes[:, None] * self.leaf_size + np.arange(self.leaf_size)).ravel()
+        # the last leaf may be partly padding:
+        candidates = candidates[candidates < self.count]
+        t, s, distances = getRaySegmentDistances(origin, direction, self.starts[candidates],
+                                                 self.ends[candidates])
+        hit = distances <= self.radius
+        if not np.any(hit):
+            return None
+        # where the ray enters the capsule (about):
+        t = t - np.sqrt(np.maximum(self.radius**2 - distances**2, 0.0))
+        nearest = np.flatnonzero(hit)[np.argmin(t[hit])]
+        return int(self.order[candidates[nearest]]), float(max(t[nearest], 0.0)), float(s[nearest])
+
+    def __repr__(self):
+        return "Segment BVH -- segments: {}, leaf size: {}, depth: {}".format(
+                self.count, self.leaf_size, self.depth)
+
+
+class BonePicker():
+    """
+    Picks the rings of actuators (bones: actuators x n x 3 ring centers), the
+    BVH is built with the first bones and refit with the actuators which
+    moved since then
+    """
+
+    def __init__(self, radius):
+        self.radius = radius
+        self.bvh = None
+        self.bones = None
+        self.builds = 0
+        self.refits = 0
+
+    def update(self, bones, actuators=None):
+        """The bones of all actuators or only of the given actuators"""
+        bones = np.asarray(bones, dtype=np.float32)
+        if actuators is None:
+            if self.bvh is not None and bones.shape == self.bones.shape:
+                actuators = np.flatnonzero(np.any(bones != self.bones, axis=(1, 2)))
+                bones = bones[actuators]
+            else:
+                self.bones = bones.copy()
+                self.bvh = SegmentBVH(bones[:, :-1].reshape(-1, 3), bones[:, 1:].reshape(-1, 3),
+                                      self.radius)
+                self.builds += 1
+                return
+        if not len(actuators):
+            return
+        self.bones[actuators] = bones
+        if len(actuators) > len(self.bones) // 4:
+            # cheaper than gathering the moved segments:
+            self.bvh.refit(self.bones[:, :-1].reshape(-1, 3), self.bones[:, 1:].reshape(-1, 3))
+        else:
+            segments = self.bones.shape[1] - 1
+            self.bvh.refit(bones[:, :-1].reshape(-1, 3), bones[:, 1:].reshape(-1, 3),
+                           (np.asarray(actuators)[:, None] * segments + np.arange(segments)).ravel())
+        self.refits += 1
+
+    def pick(self, origin, direction):
+        """
+        Returns the actuator, the ring nearest to the hit, its position and the
+        distance along the ray or None
+        """
+        if self.bvh is None:
+            return None
+        hit = self.bvh.intersect(origin, direction)
+        if hit is None:
+            return None
+        segment, distance, s = hit
+        actuator, bone = divmod(segment, self.bones.shape[1] - 1)
+        ring = bone + int(s > 0.5)
+        return actuator, ring, self.bones[actuator, ring].copy(), distance
+
+    def __repr__(self):
+        return "Bone picker -- {}, builds: {}, refits: {}".format(self.bvh, self.builds, self.refits)
+
+
+"""
+Returns the 30 bit Morton codes of the points (... x 3) in their bounding box
+"""
+def getMortonCodes(points):
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+    if not len(points):
+        return np.zeros(0, dtype=np.uint64)
+    lower = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - lower, 1e-12)
+    cells = np.clip((points - lower) / extent * 1024, 0, 1023).astype(np.uint64)
+    # 10 bits -> every third of 30 bits:
+    cells = (cells | (cells << np.uint64(16))) & np.uint64(0x030000FF)
+    cells = (cells | (cells << np.uint64(8))) & np.uint64(0x0300F00F)
+    cells = (cells | (cells << np.uint64(4))) & np.uint64(0x030C30C3)
+    cells = (cells | (cells << np.uint64(2))) & np.uint64(0x09249249)
+    return (cells[:, 0] << np.uint64(2)) | (cells[:, 1] << np.uint64(1)) | cells[:, 2]
+
+
+"""
+Input:
+a ray (origin, normalized direction) and segments (starts and ends, k x 3)
+
+Returns:
+for each segment the distance along the ray (t >= 0) and the position on the
+segment (s, 0.0,... 1.0) of the closest points and their distance
+"""
+def getRaySegmentDistances(origin, direction, starts, ends):
+    u = ends - starts
+    w = origin - starts
+    b = u @ direction
+    c = np.maximum(np.einsum("ij,ij->i", u, u), 1e-12)
+    d = w @ direction
+    e = np.einsum("ij,ij->i", u, w)
+    # closest points of the infinite lines (a = 1), parallel lines -> s = 0:
+    denominator = c - b * b
+    s = np.where(denominator > 1e-12, (e - b * d) / np.maximum(denominator, 1e-12), 0.0)
+    s = np.clip(s, 0.0, 1.0)
+    t = np.maximum(b * s - d, 0.0)
+    s = np.clip((t * b + e) / c, 0.0, 1.0)
+    distances = np.linalg.norm(origin + t[:, None] * direction - (starts + s[:, None] * u), axis=1)
+    return t, s, distances
+
+
+"""
+Returns the ray (origin, direction) through the pixel (x, y) of a window with
+width x height pixels seen from the camera (perspective with fov_y degrees)
+"""
+def getPickRay(camera, x, y, width, height, fov_y=45.0):
+    tangent = math.tan(math.radians(fov_y) / 2.0)
+    ndc_x = (2.0 * x / width - 1.0) * tangent * width / height
+    ndc_y = (1.0 - 2.0 * y / height) * tangent
+    front, right, up = (np.array(tuple(v), dtype=np.float64)
+                        for v in (camera.front, camera.right, camera.up))
+    direction = front + ndc_x * right + ndc_y * up
+    return np.array(tuple(camera.position), dtype=np.float64), direction / np.linalg.norm(direction)
+
+
+if __name__ == '__main__':
+    # pick time for a grid of actuators (segments = actuators * (n - 1)):
+    import time
+    import argparse
+    from geometry import createStartPoints, createEndPoints
+    from pose import interpolatePoses
+    parser = argparse.ArgumentParser(description="BVH picking benchmark")
+    parser.add_argument("--segments", type=int, default=100000)
+    parser.add_argument("--picks", type=int, default=1000)
+    args = parser.parse_args()
+
+    color = [0.0, 0.0, 0.0, 1.0]
+    n = 10
+    count = -(-args.segments // (n - 1))
+    columns = int(math.ceil(math.sqrt(count)))
+    offsets = np.zeros((count, 3))
+    offsets[:, 0] = (np.arange(count) % columns) * 5.0
+    offsets[:, 2] = -(np.arange(count) // columns) * 5.0
+
+    def getPoses(bends):
+        poses = interpolatePoses(createStartPoints(n, 2, color)[0], createEndPoints(n, 2, color)[0], bends)
+        return poses + offsets[:, None]
+
+    poses = getPoses(np.random.rand(count))
+    start = time.perf_counter()
+    bvh = SegmentBVH(poses[:, :-1].reshape(-1, 3), poses[:, 1:].reshape(-1, 3), 0.5)
+    print(bvh, "-- build: {:.2f} ms".format((time.perf_counter() - start) * 1000.0))
+    def getMedianTime(function, repeats=10):
+        seconds = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            function()
+            seconds.append(time.perf_counter() - start)
+        return np.median(seconds) * 1000.0
+
+    poses = getPoses(np.random.rand(count))
+    starts, ends = poses[:, :-1].reshape(-1, 3), poses[:, 1:].reshape(-1, 3)
+    print("refit: {:.2f} ms".format(getMedianTime(lambda: bvh.refit(starts, ends))))
+    moved = np.random.choice(count, count // 100, replace=False)
+    segments = (moved[:, None] * (n - 1) + np.arange(n - 1)).ravel()
+    print("refit of 1% of the actuators: {:.2f} ms".format(getMedianTime(
+          lambda: bvh.refit(poses[moved, :-1].reshape(-1, 3), poses[moved, 1:].reshape(-1, 3), segments))))
+
+    # rays from above the grid down onto random actuators:
+    targets = offsets[np.random.randint(0, count, args.picks)] + [0.0, 1.0, 0.0]
+    origins = targets + np.random.uniform(-3.0, 3.0, (args.picks, 3)) + [0.0, 20.0, 10.0]
+    hits = 0
+    start = time.perf_counter()
+    for origin, target in zip(origins, targets):
+        hits += bvh.intersect(origin, target - origin) is not None
+    seconds = (time.perf_counter() - start) / args.picks
+    print("pick: {:.3f} ms ({} of {} rays hit)".format(seconds * 1000.0, hits, args.picks))
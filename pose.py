@@ -0,0 +1,207 @@
+import math
+from collections import OrderedDict
+import numpy as np
+
+"""
+Vectorized form of the elliptic interpolation described in main.py, every pose
+for every p is calculated at once instead of one vertex after the other.
+
+Input:
+start_positions and end_positions of the bones, each of shape (bones x 3)
+
+The ellipse of each bone only depends on its start and end position, so it is
+calculated once and interpolate(ps) only evaluates the ellipses at the
+animation parameters ps (a single p or an array of p values).
+
+The first vertex is the fixed base of the actuator and always stays at its
+start position. A vertex with y_s == y_e (or y_s == 0) has no ellipse through
+start and end (a -> infinity), it is linearly interpolated instead.
+"""
+class PoseInterpolator():
+
+    def __init__(self, start_positions, end_positions):
+        self.start = np.asarray(start_positions, dtype=np.float64)
+        self.end = np.asarray(end_positions, dtype=np.float64)
+
+        y_s = self.start[:, 1]
+        x_e = self.end[:, 0]
+        y_e = self.end[:, 1]
+
+        degenerate = np.isclose(y_s**2, y_e**2) | (y_s == 0.0)
+        degenerate[0] = True
+        self.ellipse = ~degenerate
+        # only the vertices on an ellipse:
+        y_s = y_s[self.ellipse]
+        x_e = x_e[self.ellipse]
+        y_e = y_e[self.ellipse]
+        self.a_y_s = x_e / np.sqrt(y_s**2 - y_e**2) * y_s
+        self.y_s = y_s
+        self.t_s = math.pi/2
+        self.t_e = np.arcsin(np.clip(y_e / y_s, -1.0, 1.0))
+
+    def interpolate(self, ps):
+        """Returns the poses as (poses x bones x 3) float32 array"""
+        ps = np.atleast_1d(np.asarray(ps, dtype=np.float64))[:, None] # (poses x 1)
+        t = self.t_s + ps * (self.t_e - self.t_s) # (poses x ellipse bones)
+
+        # the z component is linearly interpolated for all vertices (the ellipse
+        # lies in the x, y plane):
+        poses = self.start + ps[:, :, None] * (self.end - self.start) # (poses x bones x 3)
+        poses[:, self.ellipse, 0] = self.a_y_s * np.cos(t)
+        poses[:, self.ellipse, 1] = self.y_s * np.sin(t)
+        poses[:, 0] = self.start[0]
+        return poses.astype(np.float32)
+
+
+"""
+Input:
+start_positions and end_positions of the bones, each of shape (bones x 3)
+and the animation parameters ps (a single p or an array of p values)
+
+Returns:
+The poses as (poses x bones x 3) float32 array (see PoseInterpolator)
+"""
+def interpolatePoses(start_positions, end_positions, ps):
+    return PoseInterpolator(start_positions, end_positions).interpolate(ps)
+
+
+"""
+Vectorized replacement of the per frame glm calculation of the circle
+transformations, every bone of every pose is handled at once.
+
+Each circle is rotated from its initial normal vector v_n0 = (0, 1, 0) onto the
+normalized gradient vector v_ni of the bone curve at p_i (central difference,
+backward difference for the last bone, no rotation for the first bone) and then
+translated to p_i:
+angle = acos(|v_n0 . v_ni|)
+rot_axis = v_n0 x v_ni = (z, 0, -x) (for v_ni = (x, y, z))
+If v_ni is parallel to v_n0 the rotation axis vanishes -> no rotation
+
+Input:
+The bone positions of one pose (bones x 3) or of many poses (poses x bones x 3)
+
+Returns:
+The model matrices (translation * rotation) as float32 array of the shape
+(bones x 4 x 4) or (poses x bones x 4 x 4), the matrices are row-major
+(numpy convention), transpose them for a column-major upload
+"""
+def computeBoneTransforms(poses):
+    poses = np.asarray(poses, dtype=np.float64)
+    single = poses.ndim == 2
+    if single:
+        poses = poses[None]
+
+    # gradient vectors, the first stays zero -> no rotation:
+    gradients = np.zeros_like(poses)
+    gradients[:, 1:-1] = poses[:, 2:] - poses[:, :-2]
+    gradients[:, -1] = poses[:, -1] - poses[:, -2]
+    lengths = np.linalg.norm(gradients, axis=-1, keepdims=True)
+    v_ni = gradients / np.where(lengths > 0.0, lengths, 1.0)
+
+    x, y, z = v_ni[..., 0], v_ni[..., 1], v_ni[..., 2]
+    axis_length = np.sqrt(x**2 + z**2)
+    rotate = axis_length > 1e-9
+    axis_length = np.where(rotate, axis_length, 1.0)
+    u_x = np.where(rotate, z / axis_length, 0.0)
+    u_z = np.where(rotate, -x / axis_length, 0.0)
+    angle = np.where(rotate, np.arccos(np.clip(np.abs(y), 0.0, 1.0)), 0.0)
+    c, s = np.cos(angle), np.sin(angle)
+
+    # Rodrigues' rotation formula with the unit axis u = (u_x, 0, u_z):
+    # R = c * I + s * [u]x + (1 - c) * u * u^T
+    transforms = np.zeros(poses.shape[:2] + (4, 4), dtype=np.float32)
+    transforms[..., 0, 0] = c + (1 - c) * u_x**2
+    transforms[..., 0, 1] = -s * u_z
+    transforms[..., 0, 2] = (1 - c) * u_x * u_z
+    transforms[..., 1, 0] = s * u_z
+    transforms[..., 1, 1] = c
+    transforms[..., 1, 2] = -s * u_x
+    transforms[..., 2, 0] = (1 - c) * u_x * u_z
+    transforms[..., 2, 1] = s * u_x
+    transforms[..., 2, 2] = c + (1 - c) * u_z**2
+    # translation:
+    transforms[..., :3, 3] = poses
+    transforms[..., 3, 3] = 1.0
+
+    if single:
+        return transforms[0]
+    return transforms
+
+
+"""
+Evaluates the pose (bone positions and circle transformations) of any
+animation parameter p in closed form. p is quantized to the given resolution
+and the poses are kept in a LRU cache of capacity entries, so memory stays
+the same no matter how fine the resolution is.
+
+Each cached pose occupies a slot (0,... capacity - 1), a slot is reused when
+its pose is evicted. This way a GPU buffer with capacity poses (see
+PoseAtlas and Skin) can mirror the cache: only poses which are new in the
+cache need an upload into their slot.
+"""
+class PoseEvaluator():
+
+    def __init__(self, start_positions, end_positions, resolution=1e-4, capacity=256):
+        self.interpolator = PoseInterpolator(start_positions, end_positions)
+        self.resolution = resolution
+        self.capacity = capacity
+        # quantized p -> (slot, positions, transforms), least recently used first:
+        self.cache = OrderedDict()
+        self.free_slots = list(range(capacity - 1, -1, -1))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def evaluate(self, p, pose=None):
+        """
+        Returns:
+        slot, positions (bones x 3), transforms (bones x 4 x 4) and if the pose
+        is new in the cache (and its slot must be uploaded)
+        A pose (positions, transforms) of the quantized p which was calculated
+        elsewhere (see SimulationWorker) is taken over instead of calculated
+        """
+        key = self.getKey(p)
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return entry + (False,)
+
+        self.misses += 1
+        if self.free_slots:
+            slot = self.free_slots.pop()
+        else:
+            # evict the least recently used pose and reuse its slot:
+            _, (slot, _, _) = self.cache.popitem(last=False)
+            self.evictions += 1
+        if pose is not None:
+            entry = (slot, np.array(pose[0], dtype=np.float32), np.array(pose[1], dtype=np.float32))
+        else:
+            positions = self.interpolator.interpolate(self.getQuantized(p))[0]
+            entry = (slot, positions, computeBoneTransforms(positions))
+        self.cache[key] = entry
+        return entry + (True,)
+
+    def reserveSlot(self):
+        """
+        Takes a slot away from the cache (e.g. for poses which are received, see
+        Animation.showPose), the cache has one slot less from now on
+        """
+        if self.free_slots:
+            return self.free_slots.pop()
+        _, (slot, _, _) = self.cache.popitem(last=False)
+        self.evictions += 1
+        return slot
+
+    def getKey(self, p):
+        return int(round(min(max(p, 0.0), 1.0) / self.resolution))
+
+    def getQuantized(self, p):
+        """Returns the p of the cached pose of p"""
+        return min(self.getKey(p) * self.resolution, 1.0)
+
+    def __repr__(self):
+        total = max(self.hits + self.misses, 1)
+        return "Pose cache -- entries: {}/{}, hits: {}, misses: {}, evictions: {}, hit rate: {:.1%}".format(
+                len(self.cache), self.capacity, self.hits, self.misses,
+                self.evictions, self.hits / total)
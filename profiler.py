@@ -0,0 +1,199 @@
+import json
+import time
+from OpenGL.GL import *
+
+"""
+Per frame profiling of the main loop phases:
+
+with profiler.phase("skin draw"):
+    skin.draw(shader, pose_nr)
+
+The CPU time of a phase comes from time.perf_counter, the GPU time from a
+GL_TIME_ELAPSED query which is read back some frames later (when its result
+is available) so the render loop never waits for the GPU. The GPU phases
+must not be nested (only one GL_TIME_ELAPSED query can be active).
+At the end of each frame endFrame records counters (e.g. draw calls and
+uniform uploads). export writes everything as Chrome trace-event JSON
+(open it in chrome://tracing or https://ui.perfetto.dev).
+
+A disabled profiler returns the same do-nothing context manager for every
+phase, so the instrumentation can stay in the main loop.
+"""
+class NullPhase():
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+
+NULL_PHASE = NullPhase()
+
+
+class Phase():
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.query = None
+
+    def __enter__(self):
+        if self.profiler.gpu:
+            self.query = self.profiler.getQuery()
+            glBeginQuery(GL_TIME_ELAPSED, self.query)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        # e.g. sys.exit in the phase, the GL context may be gone already:
+        if exception[0] is not None:
+            return False
+        end = time.perf_counter()
+        if self.query is not None:
+            glEndQuery(GL_TIME_ELAPSED)
+        self.profiler.addPhase(self.name, self.start, end, self.query)
+        return False
+
+
+class Profiler():
+
+    def __init__(self, enabled=False, gpu=True, summary_interval=1.0):
+        self.enabled = enabled
+        self.gpu = enabled and gpu
+        self.origin = time.perf_counter()
+        self.frame = 0
+        # chrome trace events:
+        self.events = []
+        # GPU queries which aren't read yet: (query, name, start):
+        self.pending = []
+        self.free_queries = []
+        # averages of the last summary_interval seconds:
+        self.summary_interval = summary_interval
+        self.summary = ""
+        self.summary_start = self.origin
+        self.summary_frames = 0
+        self.cpu_times = {}
+        self.gpu_times = {}
+
+    def phase(self, name):
+        if not self.enabled:
+            return NULL_PHASE
+        return Phase(self, name)
+
+    def getQuery(self):
+        if self.free_queries:
+            return self.free_queries.pop()
+        # glGenQueries returns an array of the ids:
+        return int(glGenQueries(1)[0])
+
+    def toMicroseconds(self, t):
+        return (t - self.origin) * 1e6
+
+    def addPhase(self, name, start, end, query):
+        self.events.append({"name": name, "ph": "X", "pid": 0, "tid": "CPU",
+                            "ts": self.toMicroseconds(start),
+                            "dur": (end - start) * 1e6,
+                            "args": {"frame": self.frame}})
+        self.cpu_times[name] = self.cpu_times.get(name, 0.0) + end - start
+        if query is not None:
+            self.pending.append((query, name, start, self.frame))
+
+    def collectQueries(self, wait=False):
+        """Reads the GPU times of all finished queries"""
+        pending = []
+        for query, name, start, frame in self.pending:
+            if not wait and not glGetQueryObjectiv(query, GL_QUERY_RESULT_AVAILABLE):
+                pending.append((query, name, start, frame))
+                continue
+            duration = glGetQueryObjectui64v(query, GL_QUERY_RESULT) * 1e-9
+            self.free_queries.append(query)
+            # the GPU work is shown at the time it was submitted:
+            self.events.append({"name": name, "ph": "X", "pid": 0, "tid": "GPU",
+                                "ts": self.toMicroseconds(start),
+                                "dur": duration * 1e6,
+                                "args": {"frame": frame}})
+            self.gpu_times[name] = self.gpu_times.get(name, 0.0) + duration
+        self.pending = pending
+
+    def endFrame(self, **counters):
+        """Call once at the end of a frame, e.g. endFrame(draw_calls=3)"""
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if counters:
+            self.events.append({"name": "counters", "ph": "C", "pid": 0,
+                                "ts": self.toMicroseconds(now), "args": counters})
+        if self.gpu:
+            self.collectQueries()
+        self.frame += 1
+        self.summary_frames += 1
+        if now - self.summary_start >= self.summary_interval:
+            self.updateSummary(now)
+
+    def updateSummary(self, now):
+        frames = self.summary_frames
+        parts = ["{:.1f} fps".format(frames / (now - self.summary_start))]
+        for name, cpu_time in self.cpu_times.items():
+            part = "{} {:.2f}".format(name, cpu_time / frames * 1000.0)
+            if name in self.gpu_times:
+                part += "/{:.2f}".format(self.gpu_times[name] / frames * 1000.0)
+            parts.append(part)
+        # milliseconds per frame (CPU/GPU):
+        self.summary = " | ".join(parts) + " ms"
+        self.summary_start = now
+        self.summary_frames = 0
+        self.cpu_times = {}
+        self.gpu_times = {}
+
+    def export(self, filename):
+        """Writes the recorded frames as Chrome trace-event JSON"""
+        if self.gpu:
+            self.collectQueries(wait=True)
+        with open(filename, "w") as file:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, file)
+        print("Profile of", self.frame, "frames written to", filename)
+
+
+"""
+Wall-clock time of the startup stages (e.g. imports, context, shader,...):
+
+with startup.stage("shader"):
+    shader = Shader(...)
+print(startup)
+"""
+class StartupTimer():
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.stages = []
+
+    def stage(self, name):
+        return StartupStage(self, name)
+
+    def add(self, name, seconds):
+        self.stages.append((name, seconds))
+
+    def total(self):
+        return time.perf_counter() - self.origin
+
+    def __repr__(self):
+        lines = ["Startup time[ms] -- total: {:.1f}".format(self.total() * 1000.0)]
+        for name, seconds in self.stages:
+            lines.append("  {:<16} {:8.1f}".format(name, seconds * 1000.0))
+        return "\n".join(lines)
+
+
+class StartupStage():
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        self.timer.add(self.name, time.perf_counter() - self.start)
+        return False
@@ -0,0 +1,274 @@
+import os
+import time
+import struct
+import numpy as np
+
+from sensor import RECORD_SIZE, CHANNELS, SensorInput, simulateSamples
+
+"""
+Recordings of sensor data for the replay in the visualization.
+
+A recording is an append-only binary file: a header of HEADER_SIZE bytes
+followed by the samples as records of 3 little-endian float32 values
+(time, bend, pressure), the same records as the live sensor stream (see
+sensor.py). The times must not decrease.
+
+The sparse timestamp index (path + ".idx") holds the time of every
+index_interval-th record as float64, with it a time is found in
+O(log n): a binary search in the index selects the block of index_interval
+records and a second binary search finds the record in the block. The
+index is rebuilt from the records if it is missing or incomplete.
+
+Both files are read with np.memmap, opening a recording doesn't read the
+records and every window of records is a view into the file (no copy).
+"""
+MAGIC = b"PSVREC\r\n"
+VERSION = 1
+# magic, version, channels, index_interval (padded to 64 bytes):
+HEADER = struct.Struct("<8sIII44x")
+HEADER_SIZE = HEADER.size
+
+
+def readHeader(path):
+    with open(path, "rb") as file:
+        data = file.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE:
+        raise ValueError("{} is not a recording (too short)".format(path))
+    magic, version, channels, index_interval = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError("{} is not a recording".format(path))
+    if version != VERSION or channels != CHANNELS:
+        raise ValueError("{}: unsupported recording version {} ({} channels)".format(
+                         path, version, channels))
+    return index_interval
+
+
+"""
+Returns the number of complete records of the recording at path (a record
+which was only partly written, e.g. by a crash, isn't counted)
+"""
+def getRecordCount(path):
+    return (os.path.getsize(path) - HEADER_SIZE) // RECORD_SIZE
+
+
+class RecordingWriter():
+    """Appends samples (k x 3) to a new or an existing recording"""
+
+    def __init__(self, path, index_interval=4096):
+        self.path = path
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self.index_interval = readHeader(path)
+            self.count = getRecordCount(path)
+            # cut off an incomplete record and the index entries after it:
+            os.truncate(path, HEADER_SIZE + self.count * RECORD_SIZE)
+            index_path = path + ".idx"
+            if os.path.exists(index_path):
+                entries = -(-self.count // self.index_interval)
+                if os.path.getsize(index_path) > entries * 8:
+                    os.truncate(index_path, entries * 8)
+            # complete the index if it is missing entries:
+            index = np.array(Recording(path).index, dtype="<f8")
+            with open(index_path, "wb") as file:
+                file.write(index.tobytes())
+            self.file = open(path, "ab")
+        else:
+            self.index_interval = index_interval
+            self.count = 0
+            self.file = open(path, "wb")
+            self.file.write(HEADER.pack(MAGIC, VERSION, CHANNELS, index_interval))
+            open(path + ".idx", "wb").close()
+        self.index_file = open(path + ".idx", "ab")
+
+    def write(self, samples):
+        records = np.asarray(samples, dtype="<f4").reshape(-1, CHANNELS)
+        if not len(records):
+            return
+        self.file.write(records.tobytes())
+        # the times of the records at multiples of index_interval:
+        first = -self.count % self.index_interval
+        self.index_file.write(records[first::self.index_interval, 0].astype("<f8").tobytes())
+        self.count += len(records)
+
+    def flush(self):
+        self.file.flush()
+        self.index_file.flush()
+
+    def close(self):
+        self.file.close()
+        self.index_file.close()
+
+    def __repr__(self):
+        return "Recording {} -- records: {}".format(self.path, self.count)
+
+
+class Recording():
+    """
+    Read-only view of a recording, records (count x 3) is a np.memmap,
+    records which are appended after opening aren't seen
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_interval = readHeader(path)
+        count = getRecordCount(path)
+        if count > 0:
+            self.records = np.memmap(path, dtype="<f4", mode="r", offset=HEADER_SIZE,
+                                     shape=(count, CHANNELS))
+        else:
+            self.records = np.zeros((0, CHANNELS), dtype="<f4")
+        self.times = self.records[:, 0]
+        self.index = self.loadIndex()
+
+    def loadIndex(self):
+        entries = -(-len(self.records) // self.index_interval)
+        index_path = self.path + ".idx"
+        if entries > 0 and os.path.exists(index_path) and os.path.getsize(index_path) >= entries * 8:
+            return np.memmap(index_path, dtype="<f8", mode="r", shape=(entries,))
+        # rebuild it, this reads one record per index_interval records:
+        return np.array(self.times[::self.index_interval], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def start_time(self):
+        return float(self.times[0]) if len(self) else 0.0
+
+    @property
+    def end_time(self):
+        return float(self.times[-1]) if len(self) else 0.0
+
+    def search(self, t, side="left"):
+        """Like np.searchsorted(times, t, side) with the help of the index"""
+        block = int(np.searchsorted(self.index, t, side=side)) - 1
+        if block < 0:
+            return 0
+        start = block * self.index_interval
+        end = min(start + self.index_interval + 1, len(self))
+        return start + int(np.searchsorted(self.times[start:end], t, side=side))
+
+    def seek(self, t):
+        """Returns the number of the last record at or before the time t"""
+        return max(self.search(t, side="right") - 1, 0)
+
+    def window(self, t0, t1):
+        """Returns the records with t0 <= time <= t1 (a view, no copy)"""
+        return self.records[self.search(t0, "left"):self.search(t1, "right")]
+
+    def __repr__(self):
+        return "Recording {} -- records: {}, time: {:.3f}... {:.3f} s".format(
+                self.path, len(self), self.start_time, self.end_time)
+
+
+class ReplayInput():
+    """
+    Replays a recording like live sensor data (same interface as SensorInput)
+    with speed times the recorded speed. Each update returns the records
+    since the last update, with speed > 1 only the newest of them: as much
+    recording time as passed on the wall clock (the records of a replay with
+    speed 1), the older ones are skipped. So a fast replay costs as much per
+    frame as a slow one.
+    """
+
+    def __init__(self, path, speed=1.0, loop=True):
+        self.recording = Recording(path)
+        self.speed = speed
+        self.loop = loop
+        self.position = -1 # the record of the last update
+        self.time = self.recording.start_time
+        self.wall_start = None
+        self.wall_time = None # of the last update
+
+    def start(self):
+        self.setTime(self.recording.start_time)
+
+    def stop(self):
+        pass
+
+    def setTime(self, t):
+        """Continues the replay at the recording time t"""
+        self.time = t
+        self.time_origin = t
+        self.wall_start = time.perf_counter()
+        self.wall_time = self.wall_start
+        self.position = -1
+
+    def update(self):
+        """Advances the replay time, returns the records since the last update"""
+        recording = self.recording
+        if not len(recording):
+            return recording.records
+        wall_time = time.perf_counter()
+        elapsed = wall_time - self.wall_time
+        self.wall_time = wall_time
+        self.time = self.time_origin + (wall_time - self.wall_start) * self.speed
+        duration = max(recording.end_time - recording.start_time, 1e-9)
+        if self.time > recording.end_time and self.loop:
+            self.time = recording.start_time + (self.time - recording.start_time) % duration
+        position = recording.seek(self.time)
+        records = recording.records
+        if position < self.position:
+            # started from the beginning again, the end of the recording first:
+            end, beginning = records[self.position + 1:], records[:position + 1]
+            samples = np.concatenate((end, beginning))
+            times = np.concatenate((end[:, 0], beginning[:, 0] + duration))
+        else:
+            samples = records[self.position + 1:position + 1]
+            times = samples[:, 0]
+        self.position = position
+        if self.speed > 1.0 and len(samples):
+            # the newest records of elapsed seconds of recording time:
+            samples = samples[np.searchsorted(times, times[-1] - elapsed, side="right"):]
+        return samples
+
+    def getValues(self):
+        """Returns bend and pressure (interpolated) or None before the first update"""
+        records = self.recording.records
+        if self.position < 0:
+            return None
+        # the records around the replay time:
+        a = records[self.position]
+        if self.position + 1 >= len(records) or self.time <= a[0]:
+            return float(a[1]), float(a[2])
+        b = records[self.position + 1]
+        x = (self.time - a[0]) / max(b[0] - a[0], 1e-9)
+        return float(a[1] + x * (b[1] - a[1])), float(a[2] + x * (b[2] - a[2]))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Create or inspect recordings")
+    parser.add_argument("path")
+    parser.add_argument("--simulate", type=float, default=None,
+                        help="append this many seconds of simulated samples")
+    parser.add_argument("--sensor", default=None,
+                        help="append live samples of a source (see main.py --sensor) until ctrl+c")
+    parser.add_argument("--rate", type=int, default=5000, help="simulated samples per second")
+    args = parser.parse_args()
+
+    if args.simulate is not None:
+        writer = RecordingWriter(args.path)
+        t0 = 0.0
+        if writer.count:
+            t0 = Recording(args.path).end_time + 1.0 / args.rate
+        chunk = args.rate * 10
+        total = int(args.simulate * args.rate)
+        for first in range(0, total, chunk):
+            count = min(chunk, total - first)
+            writer.write(simulateSamples(t0 + first / args.rate, count, args.rate))
+        writer.close()
+    if args.sensor is not None:
+        writer = RecordingWriter(args.path)
+        sensor = SensorInput(args.sensor)
+        sensor.start()
+        try:
+            while True:
+                writer.write(sensor.update())
+                time.sleep(0.05)
+        except KeyboardInterrupt:
+            writer.close()
+
+    start = time.perf_counter()
+    recording = Recording(args.path)
+    print(recording)
+    print("Opened in {:.3f} ms".format((time.perf_counter() - start) * 1000.0))
@@ -0,0 +1,211 @@
+from OpenGL.GL import *
+import numpy as np
+
+from mesh import Mesh
+from skin import Skin
+from pose import interpolatePoses, computeBoneTransforms
+from colormap import Colormap
+from geometry import createCylinder, getCached
+from lod import getRingError, selectRings, getPixelScale, chooseLevel, getSkinVertices
+
+"""
+Many actuators which share the skin mesh (the two circles of the cylinder,
+see createCylinder) and a table of poses, the whole scene is drawn with the
+same 3 instanced draw calls as a single skin (see Skin.draw).
+
+The state of the actuators is kept in packed arrays (one entry per actuator):
+
+positions -> (count x 3) position of the base of the actuator
+bends     -> (count) animation parameter p (0.0 = start pose,... 1.0 = end pose)
+pressures -> (count) shown with the colormap
+
+Each bend is quantized to one of levels poses, the circle transformations of
+all levels are uploaded once. Every frame only the packed placement data
+(2 texels per actuator: position and pose, color) is uploaded into the
+actuators buffer texture, there is no Python loop over the actuators.
+
+Level of detail (see lod.py): every frame each actuator gets the cheapest
+ring resolution (ring_resolutions and m) and ring density (ring_counts and
+n) whose projected error stays below threshold pixels. The placement data is
+sorted by level and each level with actuators takes 3 instanced draw calls
+(actuatorOffset selects its range), threshold = 0 draws everything with m
+and n.
+"""
+class ActuatorScene():
+
+    def __init__(self, skin_mesh, m, start_positions, end_positions, positions,
+                 levels=256, colormap=None, r=0.5, ring_resolutions=(16, 8),
+                 ring_counts=(6, 4), threshold=1.0):
+        self.count = len(positions)
+        self.levels = levels
+        self.colormap = colormap if colormap is not None else Colormap()
+        self.threshold = threshold
+        self.fov_y = 45.0
+        self.height = 600
+
+        # the circle transformations of all pose levels:
+        n = len(start_positions)
+        poses = interpolatePoses(start_positions, end_positions, np.linspace(0.0, 1.0, levels))
+        # the ring centers of the levels (local space, see getBones):
+        self.poses = poses
+        transforms = computeBoneTransforms(poses)
+
+        # the ring densities from the cheapest to the finest (n), the rings
+        # of each pose are chosen where the pose bends most:
+        self.ring_counts = sorted(k for k in set(ring_counts) if 2 <= k < n) + [n]
+        self.density_errors = np.zeros((levels, len(self.ring_counts)))
+        skins = []
+        for j, k in enumerate(self.ring_counts):
+            table = transforms
+            if k < n:
+                indices, self.density_errors[:, j] = selectRings(poses, k)
+                table = np.take_along_axis(transforms, indices[..., None, None], axis=1)
+            skin = Skin(skin_mesh, m, k)
+            skin.setTransforms(table)
+            skins.append(skin)
+        self.skin = skins[-1]
+
+        # the ring resolutions from the cheapest to the finest (m):
+        self.ring_resolutions = sorted(x for x in set(ring_resolutions) if 3 <= x < m) + [m]
+        self.resolution_errors = getRingError(np.array(self.ring_resolutions), r)
+        self.meshes = [Mesh(*getCached(createCylinder, m=x, r=r, color=[0.0, 1.0, 0.0, 1.0]))
+                       for x in self.ring_resolutions[:-1]]
+        # skins[i][j]: resolution i and density j, the model matrices of
+        # density j are shared:
+        self.skins = [[Skin(mesh, x, skin.n, shared=skin) for skin in skins]
+                      for mesh, x in zip(self.meshes, self.ring_resolutions)] + [skins]
+
+        # the bounding sphere of an actuator in all poses (local space):
+        self.center = poses.reshape(-1, 3).mean(axis=0)
+        self.radius = np.linalg.norm(poses.reshape(-1, 3) - self.center, axis=1).max() + r
+        # actuators per level and vertices of the last frame:
+        self.level_counts = np.zeros(len(self.ring_resolutions) * len(self.ring_counts), dtype=np.intp)
+        self.level_counts[-1] = self.count
+        self.order = np.arange(self.count)
+        self.vertices = 0
+
+        self.positions = np.array(positions, dtype=np.float32).reshape(self.count, 3)
+        self.bends = np.zeros(self.count, dtype=np.float32)
+        self.pressures = np.zeros(self.count, dtype=np.float32)
+        # per actuator: (x, y, z, pose), (r, g, b, a):
+        self.data = np.zeros((self.count, 2, 4), dtype=np.float32)
+        self.data[:, 0, :3] = self.positions
+        self.data[:, 1] = self.colormap(self.pressures)
+        self.dirty = True
+
+        self.TBO = glGenBuffers(1)
+        self.texture = glGenTextures(1)
+        glBindBuffer(GL_TEXTURE_BUFFER, self.TBO)
+        glBufferData(GL_TEXTURE_BUFFER, self.data.nbytes, None, GL_DYNAMIC_DRAW)
+        glBindTexture(GL_TEXTURE_BUFFER, self.texture)
+        glTexBuffer(GL_TEXTURE_BUFFER, GL_RGBA32F, self.TBO)
+        glBindTexture(GL_TEXTURE_BUFFER, 0)
+        glBindBuffer(GL_TEXTURE_BUFFER, 0)
+
+    def delete(self):
+        for skins in self.skins:
+            for skin in skins:
+                skin.delete()
+        for mesh in self.meshes:
+            mesh.delete()
+        glDeleteTextures(1, [self.texture])
+        glDeleteBuffers(1, [self.TBO])
+
+    def setPositions(self, positions):
+        self.positions[:] = positions
+        self.data[:, 0, :3] = self.positions
+        self.dirty = True
+
+    def setBends(self, bends):
+        """Sets the bends (0.0,... 1.0) of all actuators (array or scalar)"""
+        self.bends[:] = np.clip(bends, 0.0, 1.0)
+        self.data[:, 0, 3] = np.rint(self.bends * (self.levels - 1))
+        self.dirty = True
+
+    def setPressures(self, pressures):
+        """Sets the pressures of all actuators (array or scalar)"""
+        self.pressures[:] = pressures
+        self.data[:, 1] = self.colormap(self.pressures)
+        self.dirty = True
+
+    def getSlots(self):
+        """Returns the pose level of each actuator"""
+        return self.data[:, 0, 3].astype(np.intp)
+
+    def getBones(self, actuators=None):
+        """Returns the ring centers (k x n x 3) of all or the given actuators"""
+        if actuators is None:
+            return self.poses[self.getSlots()] + self.positions[:, None]
+        return self.poses[self.getSlots()[actuators]] + self.positions[actuators, None]
+
+    def setViewport(self, fov_y, height):
+        """The vertical field of view (degrees) and the height in pixels"""
+        self.fov_y = fov_y
+        self.height = height
+
+    def updateLevels(self, camera_position):
+        """Chooses the level of detail of each actuator"""
+        if self.threshold <= 0.0:
+            return
+        # the distance to the nearest point of the bounding sphere:
+        centers = self.positions + self.center
+        distances = np.linalg.norm(centers - np.asarray(camera_position, dtype=np.float32), axis=1)
+        scale = getPixelScale(distances - self.radius, self.fov_y, self.height)
+        i = chooseLevel(self.resolution_errors, scale, self.threshold)
+        slots = self.getSlots()
+        j = chooseLevel(self.density_errors[slots], scale, self.threshold)
+        level = i * len(self.ring_counts) + j
+        order = np.argsort(level, kind="stable")
+        self.level_counts = np.bincount(level, minlength=len(self.level_counts))
+        if not np.array_equal(order, self.order):
+            self.order = order
+            self.dirty = True
+
+    def upload(self):
+        """Uploads the placement data if it changed since the last upload"""
+        if not self.dirty:
+            return
+        glBindBuffer(GL_TEXTURE_BUFFER, self.TBO)
+        # orphan the old data, the GPU may still read it (sorted by level):
+        data = self.data[self.order]
+        glBufferData(GL_TEXTURE_BUFFER, data.nbytes, data, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_TEXTURE_BUFFER, 0)
+        self.dirty = False
+
+    def draw(self, shader, camera_position=None):
+        """Always have the shader in use before calling this function!"""
+        if camera_position is not None:
+            self.updateLevels(camera_position)
+        self.upload()
+        shader.setTexture("actuators", 1, self.texture)
+        offset = 0
+        self.vertices = 0
+        densities = len(self.ring_counts)
+        for level, count in enumerate(self.level_counts):
+            if not count:
+                continue
+            skin = self.skins[level // densities][level % densities]
+            shader.setInt("actuatorOffset", offset)
+            skin.draw(shader, 0, int(count))
+            offset += count
+            self.vertices += count * getSkinVertices(skin.m, skin.n)
+        shader.setInt("actuatorOffset", 0)
+
+    def __repr__(self):
+        full = self.count * getSkinVertices(self.ring_resolutions[-1], self.ring_counts[-1])
+        return ("Actuator scene -- actuators: {}, pose levels: {}, vertices of the last frame: "
+                "{} ({:.0%} of the full detail)").format(
+                self.count, self.levels, self.vertices, self.vertices / max(full, 1))
+
+
+"""
+Returns the positions (count x 3) of count actuators on a square grid in the
+x-z plane (spacing apart), centered in front of the camera
+"""
+def createGrid(count, spacing=5.0):
+    columns = int(np.ceil(np.sqrt(count)))
+    i = np.arange(count)
+    positions = np.zeros((count, 3), dtype=np.float32)
+    positions[:, 0] = (i % columns - (columns - 1) / 2.0) * spacing
+    positions[:, 2] = -(i // columns) * spacing
+    return positions
@@ -0,0 +1,61 @@
+import time
+
+"""
+Frame scheduling of the main loop:
+
+- the animation is updated with a fixed timestep (update_rate updates per
+  second of wall-clock time), independent of the frame rate, frames which take
+  long get several updates
+- the frame rate is limited to fps by sleeping until the next frame is due
+  (with vsync the buffer swap waits for the display instead, fps = 0 means
+  no limit)
+- while nothing changes (idle) only idle_fps frames per second are drawn
+  (idle_fps = 0 means no limit)
+
+while True:
+    deltaTime = scheduler.beginFrame()
+    for _ in range(scheduler.getUpdateSteps()):
+        update(scheduler.timestep)
+    draw()
+    scheduler.endFrame(idle)
+"""
+class Scheduler():
+
+    def __init__(self, fps=60.0, update_rate=120.0, idle_fps=10.0, vsync=False, max_updates=30):
+        if update_rate <= 0:
+            raise ValueError("the update rate must be positive")
+        self.frame_time = 1.0 / fps if fps > 0 else 0.0
+        self.idle_frame_time = 1.0 / idle_fps if idle_fps > 0 else 0.0
+        self.timestep = 1.0 / update_rate
+        self.vsync = vsync
+        # a very slow frame must not cause an ever growing number of updates:
+        self.max_updates = max_updates
+        self.accumulator = 0.0
+        self.frame_start = time.perf_counter()
+
+    def beginFrame(self):
+        """Returns the time since the start of the last frame in seconds"""
+        now = time.perf_counter()
+        deltaTime = now - self.frame_start
+        self.frame_start = now
+        self.accumulator = min(self.accumulator + deltaTime,
+                               self.max_updates * self.timestep)
+        return deltaTime
+
+    def getUpdateSteps(self):
+        """Returns the number of fixed timestep updates due in this frame"""
+        steps = int(self.accumulator / self.timestep)
+        self.accumulator -= steps * self.timestep
+        return steps
+
+    def endFrame(self, idle=False):
+        """Sleeps until the next frame is due"""
+        if idle:
+            frame_time = self.idle_frame_time
+        elif self.vsync:
+            return
+        else:
+            frame_time = self.frame_time
+        delay = self.frame_start + frame_time - time.perf_counter()
+        if delay > 0.0:
+            time.sleep(delay)
@@ -0,0 +1,235 @@
+import sys
+import math
+import time
+import socket
+import threading
+import numpy as np
+
+"""
+Live sensor data of the actuator.
+
+A sample is one record of 3 little-endian float32 values:
+[time (seconds since the start of the stream), bend (0.0 = straight,
+1.0 = fully bent), pressure (0.0,... 1.0)]
+
+The samples are read by a background thread from a socket, a pipe or a file
+(or generated by the SensorSimulator) and written into a preallocated
+RingBuffer, which the render loop drains once per frame without blocking.
+"""
+RECORD_SIZE = 3 * 4 # 3 float32 values per sample
+CHANNELS = 3 # time, bend, pressure
+
+
+class RingBuffer():
+    """
+    Preallocated ring buffer for one producer and one consumer thread, neither
+    of them ever waits for the other. The producer only changes self.reserved
+    (before) and self.written (after the samples are in place), the consumer
+    only changes self.read.
+    If the producer is faster than the consumer the oldest samples are lost.
+    """
+
+    def __init__(self, capacity=2**16, channels=CHANNELS):
+        self.data = np.zeros((capacity, channels), dtype=np.float64)
+        self.capacity = capacity
+        self.written = 0 # number of samples written since the start
+        self.reserved = 0 # number of samples written or being written
+        self.read = 0 # number of samples read since the start
+        self.dropped = 0 # number of samples which were overwritten unread
+
+    def write(self, samples):
+        """Producer: samples (k x channels)"""
+        samples = samples[-self.capacity:]
+        k = len(samples)
+        self.reserved = self.written + k
+        start = self.written % self.capacity
+        end = start + k
+        if end <= self.capacity:
+            self.data[start:end] = samples
+        else:
+            split = self.capacity - start
+            self.data[start:] = samples[:split]
+            self.data[:end - self.capacity] = samples[split:]
+        # publish the samples:
+        self.written += k
+
+    def drain(self):
+        """Consumer: returns a copy of all unread samples (k x channels)"""
+        read = self.read
+        written = self.written
+        if written - read > self.capacity:
+            read = written - self.capacity
+        start = read % self.capacity
+        end = start + (written - read)
+        if end <= self.capacity:
+            samples = self.data[start:end].copy()
+        else:
+            samples = np.concatenate((self.data[start:], self.data[:end - self.capacity]))
+        # the producer could have overwritten the oldest samples while copying:
+        overwritten = max(self.reserved - self.capacity - read, 0)
+        samples = samples[overwritten:]
+        self.dropped += read + overwritten - self.read
+        self.read = written
+        return samples
+
+
+"""
+Opens a sample source, the source is one of:
+tcp://host:port, unix:///path/to/socket, - (stdin) or a path to a file or a pipe
+
+Returns:
+An unbuffered binary file object, read returns what is available
+"""
+def openSource(source):
+    if source.startswith("tcp://"):
+        host, port = source[len("tcp://"):].rsplit(":", 1)
+        connection = socket.create_connection((host, int(port)))
+        return connection.makefile("rb", buffering=0)
+    if source.startswith("unix://"):
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.connect(source[len("unix://"):])
+        return connection.makefile("rb", buffering=0)
+    if source == "-":
+        return sys.stdin.buffer.raw
+    return open(source, "rb", buffering=0)
+
+
+class SensorReader(threading.Thread):
+    """Background thread which reads the samples of a source into a ring buffer"""
+
+    def __init__(self, file, ring, chunk_size=4096):
+        super().__init__(daemon=True)
+        self.file = file
+        self.ring = ring
+        # maximum number of samples per read:
+        self.chunk_size = chunk_size
+        self.running = True
+
+    def run(self):
+        rest = b""
+        while self.running:
+            data = self.file.read(self.chunk_size * RECORD_SIZE)
+            if not data: # end of the stream
+                break
+            data = rest + data
+            # a read can end in the middle of a sample:
+            complete = len(data) - len(data) % RECORD_SIZE
+            rest = data[complete:]
+            if complete:
+                samples = np.frombuffer(data[:complete], dtype="<f4")
+                self.ring.write(samples.reshape(-1, CHANNELS))
+        self.file.close()
+
+    def stop(self):
+        self.running = False
+
+
+"""
+Stand-in for the real actuator, returns count samples (count x 3) starting at
+time t0 with the given sample rate: the actuator bends back and forth with
+the given frequency, the pressure follows the bend with some noise
+"""
+def simulateSamples(t0, count, rate, frequency=0.25, noise=0.02):
+    t = t0 + np.arange(count) / rate
+    bend = 0.5 - 0.5 * np.cos(2 * math.pi * frequency * t)
+    pressure = np.clip(bend + noise * np.random.randn(count), 0.0, 1.0)
+    return np.stack((t, bend, pressure), axis=1)
+
+
+class SensorSimulator(threading.Thread):
+    """
+    Background thread which writes simulated samples with the given rate
+    either into a ring buffer or (if file is given) as records into a binary
+    file object, the samples come in bursts of burst samples
+    """
+
+    def __init__(self, ring=None, file=None, rate=5000, burst=250):
+        super().__init__(daemon=True)
+        self.ring = ring
+        self.file = file
+        self.rate = rate
+        self.burst = burst
+        self.running = True
+
+    def run(self):
+        start = time.perf_counter()
+        sent = 0
+        while self.running:
+            samples = simulateSamples(sent / self.rate, self.burst, self.rate)
+            if self.ring is not None:
+                self.ring.write(samples)
+            else:
+                try:
+                    self.file.write(samples.astype("<f4").tobytes())
+                except (BrokenPipeError, ConnectionError):
+                    break
+            sent += self.burst
+            # sleep until the next burst is due:
+            delay = start + sent / self.rate - time.perf_counter()
+            if delay > 0.0:
+                time.sleep(delay)
+
+    def stop(self):
+        self.running = False
+
+
+class SensorInput():
+    """
+    Connects a source with the render loop: call update once per frame, then
+    getValues returns the bend and pressure of the newest sample or (if delay
+    is given in seconds) the values interpolated at newest time - delay, which
+    gives a smooth motion if the samples arrive in bursts
+    """
+
+    def __init__(self, source, capacity=2**16, delay=0.0, history=1024):
+        self.ring = RingBuffer(capacity)
+        self.delay = delay
+        # the newest samples, needed for the interpolation:
+        self.history = np.zeros((0, CHANNELS))
+        self.history_size = history
+        if source == "sim":
+            self.thread = SensorSimulator(self.ring)
+        else:
+            self.thread = SensorReader(openSource(source), self.ring)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.thread.stop()
+
+    def update(self):
+        """Drains the ring buffer and returns the new samples"""
+        samples = self.ring.drain()
+        if len(samples):
+            self.history = np.concatenate((self.history, samples))[-self.history_size:]
+        return samples
+
+    def getValues(self):
+        """Returns bend and pressure or None if there is no sample yet"""
+        if not len(self.history):
+            return None
+        if self.delay <= 0.0:
+            return self.history[-1, 1], self.history[-1, 2]
+        t = self.history[-1, 0] - self.delay
+        return (np.interp(t, self.history[:, 0], self.history[:, 1]),
+                np.interp(t, self.history[:, 0], self.history[:, 2]))
+
+
+if __name__ == '__main__':
+    # serve simulated samples for main.py --sensor tcp://localhost:PORT
+    import argparse
+    parser = argparse.ArgumentParser(description="Sensor simulator server")
+    parser.add_argument("--port", type=int, default=5555)
+    parser.add_argument("--rate", type=int, default=5000, help="samples per second")
+    parser.add_argument("--burst", type=int, default=250, help="samples per burst")
+    args = parser.parse_args()
+
+    server = socket.create_server(("localhost", args.port))
+    print("Serving simulated samples on port", args.port)
+    while True:
+        connection, address = server.accept()
+        print("Connected:", address)
+        simulator = SensorSimulator(file=connection.makefile("wb", buffering=0),
+                                    rate=args.rate, burst=args.burst)
+        simulator.start()
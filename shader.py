@@ -1,21 +1,64 @@
 from OpenGL.GL import *
+from OpenGL.error import GLError, NullFunctionError
+import os
+import hashlib
 import glm
+import numpy as np
+
+"""
+Returns the 16 floats of a glm matrix or a row-major numpy matrix in the
+column-major order of OpenGL (bytes() of a glm matrix gives the rows, its
+to_bytes() the columns like glm.value_ptr)
+"""
+def getColumnMajor(matrix):
+    if isinstance(matrix, np.ndarray):
+        return np.ascontiguousarray(matrix.T, dtype=np.float32).ravel()
+    return np.frombuffer(matrix.to_bytes(), dtype=np.float32)
+
+
+"""
+Returns the cache key of a program: hash of the sources and the driver
+(needs a current context)
+"""
+def getProgramKey(vs_source, fs_source):
+    key = hashlib.sha1()
+    for part in (vs_source.encode(), fs_source.encode(), glGetString(GL_VENDOR),
+                 glGetString(GL_RENDERER), glGetString(GL_VERSION)):
+        key.update(part or b"")
+        key.update(b"\0")
+    return key.hexdigest()
+
 
 class Shader():
+    """
+    With a cache_directory the linked program is stored as program binary
+    (glGetProgramBinary) and loaded with glProgramBinary at the next start
+    instead of compiling the sources again. The cache key is the hash of the
+    sources and of the driver (vendor, renderer, version), a binary which the
+    driver rejects anyway (e.g. after an update) is compiled again.
+    """
 
-    def __init__(self, vs_filename, fs_filename):
+    def __init__(self, vs_filename, fs_filename, cache_directory=None):
         # get vertex shader source code:
         with open(vs_filename, "r") as file:
             vs_source = file.read()
 
-        print(vs_source)
-
         # get fragment shader source code:
         with open(fs_filename, "r") as file:
             fs_source = file.read()
 
-        print(fs_source)
+        self.cache_path = None
+        if cache_directory is not None:
+            self.cache_path = os.path.join(cache_directory,
+                                           getProgramKey(vs_source, fs_source) + ".bin")
+        self.from_cache = self.loadBinary()
+        if not self.from_cache:
+            self.compile(vs_source, fs_source)
+            self.storeBinary()
 
+        self.queryUniforms()
+
+    def compile(self, vs_source, fs_source):
         # compile shaders:
         vs = glCreateShader(GL_VERTEX_SHADER)
         glShaderSource(vs, vs_source)
@@ -31,6 +74,8 @@ class Shader():
 
         # link shaders, create program:
         self.id = glCreateProgram()
+        if self.cache_path is not None and bool(glProgramParameteri):
+            glProgramParameteri(self.id, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
         glAttachShader(self.id, vs)
         glAttachShader(self.id, fs)
         glLinkProgram(self.id)
@@ -41,6 +86,99 @@ class Shader():
         glDeleteShader(vs)
         glDeleteShader(fs)
 
+    def loadBinary(self):
+        """Creates the program from the cached binary, returns False on a miss"""
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return False
+        with open(self.cache_path, "rb") as file:
+            data = file.read()
+        if len(data) <= 4:
+            return False
+        # the first 4 bytes are the binary format of the driver:
+        binary_format = int(np.frombuffer(data[:4], dtype=np.uint32)[0])
+        binary = np.frombuffer(data[4:], dtype=np.uint8)
+        self.id = glCreateProgram()
+        try:
+            glProgramBinary(self.id, binary_format, binary, binary.size)
+            if glGetProgramiv(self.id, GL_LINK_STATUS) == GL_TRUE:
+                return True
+        except (GLError, NullFunctionError):
+            pass
+        glDeleteProgram(self.id)
+        return False
+
+    def storeBinary(self):
+        if self.cache_path is None:
+            return
+        try:
+            length = glGetProgramiv(self.id, GL_PROGRAM_BINARY_LENGTH)
+            if length <= 0:
+                return
+            binary = np.zeros(length, dtype=np.uint8)
+            written = np.zeros(1, dtype=np.int32)
+            binary_format = np.zeros(1, dtype=np.uint32)
+            glGetProgramBinary(self.id, length, written, binary_format, binary)
+        except (GLError, NullFunctionError):
+            return # no program binaries with this driver
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            temporary = self.cache_path + ".{}.tmp".format(os.getpid())
+            with open(temporary, "wb") as file:
+                file.write(binary_format.tobytes())
+                file.write(binary[:written[0]].tobytes())
+            os.replace(temporary, self.cache_path)
+        except OSError:
+            pass # the cache is optional
+
+    def queryUniforms(self):
+        """Looks up the locations of all active uniforms once after linking"""
+        self.locations = {}
+        for i in range(glGetProgramiv(self.id, GL_ACTIVE_UNIFORMS)):
+            name, size, uniform_type = glGetActiveUniform(self.id, i)
+            if isinstance(name, bytes):
+                name = name.decode()
+            # arrays are reported as name[0]:
+            name = name.split("[")[0]
+            location = glGetUniformLocation(self.id, name)
+            # uniforms of a uniform block have no location:
+            if location != -1:
+                self.locations[name] = location
+        # shadow copy of the values which are set in the program:
+        self.values = {}
+        # number of issued and skipped uniform uploads since the last reset:
+        self.issued = 0
+        self.skipped = 0
+        # names which are not active uniforms of the program, warned once:
+        self.unknown = set()
+
+    def resetUploadCounts(self):
+        """Returns the number of issued and skipped uploads and resets them"""
+        counts = self.issued, self.skipped
+        self.issued = 0
+        self.skipped = 0
+        return counts
+
+    def isRedundant(self, name, value):
+        # unknown or inactive uniforms (optimized out) can't be set anyway,
+        # they are no skipped uploads:
+        if name not in self.locations:
+            if name not in self.unknown:
+                self.unknown.add(name)
+                print("Warning: {} is no active uniform of the shader program".format(name))
+            return True
+        if self.values.get(name) == value:
+            self.skipped += 1
+            return True
+        self.values[name] = value
+        self.issued += 1
+        return False
+
+    def bindUniformBlock(self, name, binding):
+        """Connects the uniform block name of the program with a binding point"""
+        index = glGetUniformBlockIndex(self.id, name)
+        if index != GL_INVALID_INDEX:
+            glUniformBlockBinding(self.id, index, binding)
+
     def use(self):
         """Always have a program in use before calling any glUniform...!"""
         glUseProgram(self.id)
@@ -48,17 +186,72 @@ class Shader():
     # e.g in the shader write: uniform int index; -> name = "index"
     def setInt(self, name, x):
         """Always have a program in use before calling this function!"""
-        glUniform1i(glGetUniformLocation(self.id, name), x)
+        if not self.isRedundant(name, x):
+            glUniform1i(self.locations[name], x)
 
     def setFloat(self, name, x):
         """Always have a program in use before calling this function!"""
-        glUniform1f(glGetUniformLocation(self.id, name), x)
+        if not self.isRedundant(name, x):
+            glUniform1f(self.locations[name], x)
 
 
     def setVector(self, name, x, y, z):
         """Always have a program in use before calling this function!"""
-        glUniform3f(glGetUniformLocation(self.id, name), x, y, z)
+        if not self.isRedundant(name, (x, y, z)):
+            glUniform3f(self.locations[name], x, y, z)
 
     def setMatrix(self, name, matrix):
         """Always have a program in use before calling this function!"""
-        glUniformMatrix4fv(glGetUniformLocation(self.id, name), 1, GL_FALSE, glm.value_ptr(matrix))
+        data = getColumnMajor(matrix)
+        if not self.isRedundant(name, data.tobytes()):
+            glUniformMatrix4fv(self.locations[name], 1, GL_FALSE, data)
+
+    def setTexture(self, name, unit, texture, target=GL_TEXTURE_BUFFER):
+        """Binds the texture to the texture unit and lets the sampler name read it"""
+        glActiveTexture(GL_TEXTURE0 + unit)
+        glBindTexture(target, texture)
+        if unit != 0:
+            glActiveTexture(GL_TEXTURE0)
+        self.setInt(name, unit)
+
+
+class UniformBuffer():
+    """
+    Uniform buffer object with mat4 members in std140 layout, e.g.
+    layout(std140) uniform Camera { mat4 projection; mat4 view; };
+    -> UniformBuffer(["projection", "view"], binding)
+    Each program which uses the block must call bindUniformBlock once, then
+    all of them share the values
+    """
+
+    def __init__(self, names, binding):
+        # a mat4 takes 64 bytes in std140 layout:
+        self.offsets = {name: 64 * i for i, name in enumerate(names)}
+        self.binding = binding
+        self.id = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.id)
+        glBufferData(GL_UNIFORM_BUFFER, 64 * len(names), None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindBufferBase(GL_UNIFORM_BUFFER, binding, self.id)
+        self.values = {}
+        self.issued = 0
+        self.skipped = 0
+
+    def resetUploadCounts(self):
+        """Returns the number of issued and skipped uploads and resets them"""
+        counts = self.issued, self.skipped
+        self.issued = 0
+        self.skipped = 0
+        return counts
+
+    def setMatrix(self, name, matrix):
+        data = getColumnMajor(matrix)
+        value = data.tobytes()
+        if self.values.get(name) == value:
+            self.skipped += 1
+            return
+        self.values[name] = value
+        self.issued += 1
+        glBindBuffer(GL_UNIFORM_BUFFER, self.id)
+        glBufferSubData(GL_UNIFORM_BUFFER, self.offsets[name], data.nbytes, data)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
@@ -9,14 +9,48 @@ uniform int tsflag;
 uniform vec3 lineColor;
 uniform int objectSize;
 
+// instancing flag, the model matrices of the circles are fetched from the
+// circleTransforms buffer texture (4 texels = 4 columns per matrix) instead of
+// model1 and model2
+uniform int iflag;
+uniform samplerBuffer circleTransforms;
+// index of the first circle (e.g. of the current pose) in circleTransforms
+uniform int circleOffset;
+// number of circles to skip from one instance to the next
+uniform int instanceStride;
+
+// many actuators with one draw call (see scene.py), the instances of actuator
+// a are a * instancesPerActuator,... (a + 1) * instancesPerActuator - 1,
+// 0 means a single actuator
+uniform int instancesPerActuator;
+// 2 texels per actuator: (position, pose), color
+uniform samplerBuffer actuators;
+// index of the first actuator of the draw call in actuators
+uniform int actuatorOffset;
+// number of circles of one pose in circleTransforms
+uniform int circlesPerPose;
+
 // if only one model matrix needed use model1 (e.g. tsflag = 0)
 uniform mat4 model1;
 uniform mat4 model2;
-uniform mat4 view;
-uniform mat4 projection;
+
+// shared by all programs which draw the scene (see UniformBuffer in shader.py)
+layout(std140) uniform Camera
+{
+  mat4 projection;
+  mat4 view;
+};
 
 out vec4 color;
 
+mat4 getCircleTransform(int i)
+{
+  return mat4(texelFetch(circleTransforms, 4 * i),
+              texelFetch(circleTransforms, 4 * i + 1),
+              texelFetch(circleTransforms, 4 * i + 2),
+              texelFetch(circleTransforms, 4 * i + 3));
+}
+
 void main()
 {
   // line flag, the lines should be drawn in black
@@ -29,9 +63,37 @@ void main()
     color = aColor;
   }
 
+  if (iflag == 1)
+  {
+    int instance = gl_InstanceID;
+    int circle = circleOffset;
+    vec3 translation = vec3(0.0);
+    if (instancesPerActuator > 0)
+    {
+      int actuator = gl_InstanceID / instancesPerActuator;
+      instance = gl_InstanceID - actuator * instancesPerActuator;
+      actuator += actuatorOffset;
+      vec4 placement = texelFetch(actuators, 2 * actuator);
+      translation = placement.xyz;
+      circle += int(placement.w) * circlesPerPose;
+      if (lflag == 0)
+      {
+        color = texelFetch(actuators, 2 * actuator + 1);
+      }
+    }
+    // circle2 (bottom) of instance i belongs to the circle i * instanceStride,
+    // circle1 (top) to the next circle:
+    circle += instance * instanceStride;
+    if (gl_VertexID < objectSize)
+    {
+      circle += 1;
+    }
+    vec4 position = getCircleTransform(circle) * vec4(aPos, 1.0);
+    gl_Position = projection * view * (position + vec4(translation, 0.0));
+  }
   // transformation selection flag, if VBO has 2 objects which need to be
   // transformed individually
-  if (tsflag == 1)
+  else if (tsflag == 1)
   {
     // if the VBO is structure like: vertices of object1, vertices of object2
     // then model1 is applied to object1 and model2 on object2!
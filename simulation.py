@@ -0,0 +1,221 @@
+import time
+import threading
+import numpy as np
+
+from pose import PoseEvaluator
+
+"""
+The pose computation and the sensor input in a worker thread, decoupled from
+the render loop:
+
+worker thread: read the sensor (or advance the animation), filter, evaluate
+               the pose -> write it into the back state -> publish
+render thread: acquire the newest published state -> upload it, draw, flip
+
+The states are exchanged with a TripleBuffer, neither thread ever waits for
+the other longer than a swap of two indices. A slow flip or a burst of events
+doesn't delay the updates and a slow update doesn't delay the frames. The
+worker runs with a fixed timestep (update_rate steps per second), a state
+which the render thread didn't acquire before the next one was published is
+dropped, a frame without a new state shows the last one again (duplicated).
+The staleness is the age of a state (time since its input was read) when the
+render thread acquires it.
+
+A thread is enough here: a pose step is a few microseconds of NumPy work
+(the poses are cached, see PoseEvaluator) and the render thread spends most
+of its time in OpenGL calls and the buffer swap, which release the GIL.
+"""
+class PoseState():
+    """The state of one step: animation parameter, pressure and the pose"""
+
+    def __init__(self, n):
+        self.sequence = 0 # number of the step, 0 = nothing written yet
+        self.time = 0.0 # time.perf_counter() when the input was read
+        self.generation = 0 # see SimulationWorker.reload
+        self.p = 0.0
+        self.pressure = None
+        self.positions = np.zeros((n, 3), dtype=np.float32)
+        self.transforms = np.zeros((n, 4, 4), dtype=np.float32)
+
+
+class TripleBuffer():
+    """
+    Three states: the writer fills the back state, publish swaps it with the
+    middle state, acquire swaps the middle state with the front state (the
+    reader's) if a newer state was published. The lock only protects the
+    swaps, the states are written and read outside of it.
+    """
+
+    def __init__(self, create):
+        self.states = [create() for _ in range(3)]
+        self.back, self.middle, self.front = 0, 1, 2
+        self.fresh = False # the middle state wasn't acquired yet
+        self.lock = threading.Lock()
+        self.published = 0
+        self.acquired = 0
+        self.dropped = 0 # published, but overwritten before it was acquired
+        self.duplicated = 0 # acquires without a new state
+
+    def getBack(self):
+        """Writer: the state to fill before publish"""
+        return self.states[self.back]
+
+    def publish(self):
+        with self.lock:
+            if self.fresh:
+                self.dropped += 1
+            self.back, self.middle = self.middle, self.back
+            self.fresh = True
+            self.published += 1
+
+    def acquire(self):
+        """
+        Reader: returns the newest published state and if it is new since the
+        last acquire, the state stays valid until the next acquire
+        """
+        with self.lock:
+            if not self.fresh:
+                if self.acquired:
+                    self.duplicated += 1
+                return self.states[self.front], False
+            self.front, self.middle = self.middle, self.front
+            self.fresh = False
+            self.acquired += 1
+            return self.states[self.front], True
+
+
+class SimulationWorker(threading.Thread):
+    """
+    Computes the poses of the animation (back and forth with speed, or the
+    bend of the sensor, filtered if filters is given) in the background,
+    the render thread takes them with acquire
+    """
+
+    def __init__(self, start_positions, end_positions, speed, update_rate=120.0,
+                 sensor=None, filters=None, recorder=None, resolution=1e-4):
+        super().__init__(daemon=True)
+        if update_rate <= 0:
+            raise ValueError("the update rate must be positive")
+        self.evaluator = PoseEvaluator(start_positions, end_positions, resolution, capacity=1024)
+        self.speed = speed
+        self.timestep = 1.0 / update_rate
+        self.sensor = sensor
+        self.filters = filters
+        self.recorder = recorder
+        self.buffer = TripleBuffer(lambda: PoseState(len(start_positions)))
+        self.p = 0.0
+        self.pressure = None
+        self.flag = True
+        # set by the render thread:
+        self.paused = False
+        self.running = True
+        self.generation = 0
+        self.request = None
+        # the generation of the evaluator (worker thread):
+        self.state_generation = 0
+        self.steps = 0
+        self.late_steps = 0 # steps which started more than a timestep late
+        # staleness of the acquired states (seconds):
+        self.staleness_sum = 0.0
+        self.staleness_max = 0.0
+
+    def reload(self, start_positions, end_positions):
+        """
+        Render thread: animates between new start and end positions, the states
+        of the old positions have an older generation and are ignored
+        """
+        self.generation += 1
+        self.request = (self.generation, start_positions, end_positions)
+
+    def stop(self):
+        self.running = False
+        self.join()
+
+    def run(self):
+        next_step = time.perf_counter()
+        while self.running:
+            now = time.perf_counter()
+            if now > next_step + self.timestep:
+                self.late_steps += 1
+                # don't catch up, the next state shows the current input anyway:
+                next_step = now
+            self.step()
+            next_step += self.timestep
+            delay = next_step - time.perf_counter()
+            if delay > 0.0:
+                time.sleep(delay)
+
+    def step(self):
+        request = self.request
+        if request is not None and request[0] != self.state_generation:
+            self.state_generation, start_positions, end_positions = request
+            self.evaluator = PoseEvaluator(start_positions, end_positions,
+                                           self.evaluator.resolution, self.evaluator.capacity)
+        read_time = time.perf_counter()
+        if self.sensor is not None:
+            self.readSensor()
+        elif not self.paused:
+            # back and forth between the start and the end pose:
+            if self.p >= 1.0:
+                self.flag = False
+            elif self.p <= 0.0:
+                self.flag = True
+            delta = self.speed * self.timestep
+            self.p = min(max(self.p + (delta if self.flag else -delta), 0.0), 1.0)
+
+        _, positions, transforms, _ = self.evaluator.evaluate(self.p)
+        state = self.buffer.getBack()
+        state.sequence = self.steps + 1
+        state.time = read_time
+        state.generation = self.state_generation
+        state.p = self.evaluator.getQuantized(self.p)
+        state.pressure = self.pressure
+        state.positions[:] = positions
+        state.transforms[:] = transforms
+        self.buffer.publish()
+        self.steps += 1
+
+    def readSensor(self):
+        samples = self.sensor.update()
+        if self.recorder is not None:
+            self.recorder.write(samples)
+        if self.filters is not None:
+            filtered = self.filters.process(samples)
+            if not len(filtered):
+                return
+            values = np.clip(filtered[-1, 1:3], 0.0, 1.0)
+        else:
+            values = self.sensor.getValues()
+            if values is None:
+                return
+        self.p, self.pressure = float(values[0]), float(values[1])
+
+    def acquire(self):
+        """
+        Render thread: returns the newest state of the current generation or
+        None if there is no new one since the last acquire
+        """
+        state, new = self.buffer.acquire()
+        if not new or state.generation != self.generation:
+            return None
+        staleness = time.perf_counter() - state.time
+        self.staleness_sum += staleness
+        self.staleness_max = max(self.staleness_max, staleness)
+        return state
+
+    def getStats(self):
+        buffer = self.buffer
+        return {"steps": self.steps,
+                "late_steps": self.late_steps,
+                "published": buffer.published,
+                "acquired": buffer.acquired,
+                "dropped": buffer.dropped,
+                "duplicated": buffer.duplicated,
+                "staleness_mean_ms": self.staleness_sum / max(buffer.acquired, 1) * 1000.0,
+                "staleness_max_ms": self.staleness_max * 1000.0}
+
+    def __repr__(self):
+        return ("Simulation worker -- steps: {steps} (late: {late_steps}), states acquired: "
+                "{acquired}/{published}, dropped: {dropped}, duplicated: {duplicated}, "
+                "staleness[ms] mean: {staleness_mean_ms:.2f}, max: {staleness_max_ms:.2f}").format(
+                **self.getStats())
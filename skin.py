@@ -0,0 +1,111 @@
+from OpenGL.GL import *
+import numpy as np
+
+"""
+The skin of the actuator drawn with instanced draw calls, the mantle, the caps
+and the black rings need one draw call each, independent of the number of
+circles n. The model matrices of the circles are stored in a buffer texture
+which is read in the vertex shader (see iflag in shader.vs):
+
+Mantle (instance i = 0,... n-2, both circles of the skin mesh):
+circle2 -> circle i, circle1 -> circle i + 1
+Caps (instance 0 and 1, circle2 of the skin mesh):
+circle2 -> circle 0 and circle n - 1
+Rings (instance i = 0,... n-1, circle2 of the skin mesh):
+circle2 -> circle i
+"""
+class Skin():
+
+    def __init__(self, mesh, m, n, shared=None):
+        # the skin mesh with 2 circles of m vertices each (see main.py):
+        self.mesh = mesh
+        self.m = m
+        self.n = n
+        self.circle_count = 0
+        # the model matrices of another skin with the same n can be used:
+        self.shared = shared is not None
+        if shared is not None:
+            self.TBO = shared.TBO
+            self.texture = shared.texture
+            return
+
+        # buffer texture which holds the model matrices of the circles:
+        self.TBO = glGenBuffers(1)
+        self.texture = glGenTextures(1)
+        glBindBuffer(GL_TEXTURE_BUFFER, self.TBO)
+        glBufferData(GL_TEXTURE_BUFFER, 0, None, GL_DYNAMIC_DRAW)
+        glBindTexture(GL_TEXTURE_BUFFER, self.texture)
+        # one texel is one column of a matrix:
+        glTexBuffer(GL_TEXTURE_BUFFER, GL_RGBA32F, self.TBO)
+        glBindTexture(GL_TEXTURE_BUFFER, 0)
+        glBindBuffer(GL_TEXTURE_BUFFER, 0)
+
+    def delete(self):
+        """Frees the buffer texture (the mesh is shared and not deleted)"""
+        if self.shared:
+            return
+        glDeleteTextures(1, [self.texture])
+        glDeleteBuffers(1, [self.TBO])
+
+    def allocate(self, poses):
+        """Reserves space for the model matrices of the given number of poses"""
+        self.circle_count = poses * self.n
+        glBindBuffer(GL_TEXTURE_BUFFER, self.TBO)
+        glBufferData(GL_TEXTURE_BUFFER, self.circle_count * 64, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_TEXTURE_BUFFER, 0)
+
+    def setTransforms(self, transforms, pose_nr=None):
+        """
+        Uploads the row-major model matrices of one pose (n x 4 x 4) or of
+        many poses (poses x n x 4 x 4), either all at once or (if pose_nr is
+        given) into the space of the pose pose_nr (see allocate)
+        """
+        # transpose to get the column-major layout of OpenGL:
+        data = np.ascontiguousarray(np.swapaxes(transforms, -1, -2), dtype=np.float32)
+        glBindBuffer(GL_TEXTURE_BUFFER, self.TBO)
+        if pose_nr is not None:
+            glBufferSubData(GL_TEXTURE_BUFFER, pose_nr * self.n * 64, data.nbytes, data)
+        elif data.size // 16 == self.circle_count:
+            glBufferSubData(GL_TEXTURE_BUFFER, 0, data.nbytes, data)
+        else:
+            glBufferData(GL_TEXTURE_BUFFER, data.nbytes, data, GL_DYNAMIC_DRAW)
+            self.circle_count = data.size // 16
+        glBindBuffer(GL_TEXTURE_BUFFER, 0)
+
+    def draw(self, shader, pose_nr=0, actuator_count=0):
+        """
+        Always have the shader in use before calling this function!
+        With actuator_count > 0 the skins of that many actuators are drawn,
+        their poses and positions come from the actuators buffer texture
+        (see ActuatorScene)
+        """
+        m, n = self.m, self.n
+        shader.setTexture("circleTransforms", 0, self.texture)
+        shader.setInt("circleOffset", pose_nr * n)
+        shader.setInt("circlesPerPose", n)
+        shader.setInt("objectSize", m + 1)
+        shader.setInt("iflag", 1)
+        count = max(actuator_count, 1)
+
+        # use both circles to draw the mantle:
+        shader.setInt("lflag", 0)
+        shader.setInt("instanceStride", 1)
+        if actuator_count > 0:
+            shader.setInt("instancesPerActuator", n - 1)
+        self.mesh.drawInstanced(GL_TRIANGLE_STRIP, 2 * m + 2, 4 * m + 4, (n - 1) * count)
+        # use circle2 to draw the bottom and the top area of the actuator:
+        shader.setInt("instanceStride", n - 1)
+        if actuator_count > 0:
+            shader.setInt("instancesPerActuator", 2)
+        self.mesh.drawInstanced(GL_TRIANGLE_FAN, m + 2, m + 2, 2 * count)
+        # use circle2 to draw the black rings:
+        shader.setInt("lflag", 1)
+        shader.setInt("instanceStride", 1)
+        if actuator_count > 0:
+            shader.setInt("instancesPerActuator", n)
+        self.mesh.drawInstanced(GL_LINE_LOOP, m, 3 * m + 4, n * count)
+        shader.setInt("instancesPerActuator", 0)
+
+        # reset flags:
+        shader.setInt("lflag", 0)
+        shader.setInt("iflag", 0)
@@ -0,0 +1,73 @@
+import glm
+import numpy as np
+
+import shader
+from shader import Shader, UniformBuffer, getColumnMajor
+
+"""
+The matrices must reach OpenGL in column-major order: the translation of a
+model matrix are the floats 12, 13 and 14. No context is needed, the GL
+calls of the uploads are replaced.
+"""
+TRANSLATION = (1.0, 2.0, 3.0)
+EXPECTED = np.array([1, 0, 0, 0, 0, 1, 0, 0, 0, 0, 1, 0, 1, 2, 3, 1], dtype=np.float32)
+
+
+def getTranslations():
+    row_major = np.eye(4, dtype=np.float32)
+    row_major[:3, 3] = TRANSLATION
+    return glm.translate(glm.mat4(1.0), glm.vec3(*TRANSLATION)), row_major
+
+
+def test_column_major():
+    for matrix in getTranslations():
+        assert np.array_equal(getColumnMajor(matrix), EXPECTED)
+
+
+def test_shader_upload(monkeypatch):
+    uploads = []
+    monkeypatch.setattr(shader, "glUniformMatrix4fv",
+                        lambda location, count, transpose, data: uploads.append(np.array(data)))
+    program = Shader.__new__(Shader)
+    program.locations = {"model": 0}
+    program.values = {}
+    program.issued = program.skipped = 0
+    for matrix in getTranslations():
+        program.values = {}
+        program.setMatrix("model", matrix)
+    assert len(uploads) == 2
+    for data in uploads:
+        assert np.array_equal(np.ravel(data), EXPECTED)
+
+
+def test_unknown_uniform(monkeypatch, capsys):
+    monkeypatch.setattr(shader, "glUniform1f", lambda location, x: None)
+    program = Shader.__new__(Shader)
+    program.locations = {"scale": 0}
+    program.values = {}
+    program.issued = program.skipped = 0
+    program.unknown = set()
+    for _ in range(3):
+        program.setFloat("missing", 1.0)
+        program.setFloat("scale", 1.0)
+    assert (program.issued, program.skipped) == (1, 2)
+    assert program.unknown == {"missing"}
+    assert capsys.readouterr().out.count("missing") == 1
+
+
+def test_uniform_buffer_upload(monkeypatch):
+    uploads = []
+    monkeypatch.setattr(shader, "glBindBuffer", lambda target, buffer: None)
+    monkeypatch.setattr(shader, "glBufferSubData",
+                        lambda target, offset, size, data: uploads.append((offset, np.array(data))))
+    block = UniformBuffer.__new__(UniformBuffer)
+    block.offsets = {"projection": 0, "view": 64}
+    block.id = 1
+    block.values = {}
+    block.issued = block.skipped = 0
+    glm_matrix, numpy_matrix = getTranslations()
+    block.setMatrix("view", glm_matrix)
+    block.setMatrix("projection", numpy_matrix)
+    assert [offset for offset, _ in uploads] == [64, 0]
+    for _, data in uploads:
+        assert np.array_equal(np.ravel(data), EXPECTED)
@@ -0,0 +1,634 @@
+import os
+import sys
+import time
+import numpy as np
+import glm
+from OpenGL.GL import *
+
+# my modules:
+from shader import Shader, UniformBuffer
+from mesh import Mesh
+from camera import Camera
+from skin import Skin
+from animation import Animation
+from scheduler import Scheduler
+from bufferpool import GeometryPool
+from geometry import createStartPoints, createEndPoints, createCylinder, getCached
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+SHADER_CACHE_DIRECTORY = os.path.join(DIRECTORY, ".shader_cache")
+
+"""
+The actuator visualization as API, nothing is created on import:
+
+viewer = Viewer(args) # the options of main.py (see parser in main.py)
+viewer.init()         # context, shader, meshes, sensor,...
+viewer.run()          # window loop (or viewer.runHeadless())
+
+For offscreen rendering PYOPENGL_PLATFORM (egl or osmesa) must be set before
+this module is imported. pygame is only imported for the window, the modules
+of the optional features (scene, sensor filters, worker, capture, profiler,
+picking,...) where they are used. Each stage of init is timed, viewer.startup
+holds the breakdown.
+"""
+class Viewer():
+
+    def __init__(self, args, startup=None):
+        self.args = args
+        self.width, self.height = [int(x) for x in args.size.split("x")]
+        if startup is None:
+            from profiler import StartupTimer
+            startup = StartupTimer()
+        self.startup = startup
+        self.context = None
+        self.framebuffer = None
+        self.scene = None
+        self.sensor = None
+        self.recorder = None
+        self.filters = None
+        self.worker = None
+        self.subscriber = None
+        self.capture = None
+        self.picker = None
+        # the pose levels of the actuators at the last pick (see pick):
+        self.pick_slots = None
+        # the last sensor values (bend, pressure) shown:
+        self.sensor_values = None
+        # uniform uploads of the last frame (issued, skipped):
+        self.uniform_uploads = [0, 0]
+
+    def init(self):
+        with self.startup.stage("context"):
+            self.initContext()
+        with self.startup.stage("shader"):
+            self.initShader()
+        with self.startup.stage("bone meshes"):
+            self.initBones()
+        with self.startup.stage("animation"):
+            self.initAnimation()
+        with self.startup.stage("skin"):
+            self.initSkin()
+        with self.startup.stage("scene"):
+            self.initScene()
+        with self.startup.stage("sensor"):
+            self.initSensor()
+        with self.startup.stage("worker"):
+            self.initWorker()
+        print(self.startup)
+        print("Shader program:", "cached binary" if self.shader.from_cache else "compiled")
+
+    def initContext(self):
+        width, height = self.width, self.height
+        if self.args.headless is not None:
+            # offscreen context, the scene is drawn into a framebuffer object:
+            from headless import createContext, Framebuffer
+            self.context = createContext(width, height, self.args.headless)
+            self.framebuffer = Framebuffer(width, height)
+            self.framebuffer.bind()
+        else:
+            import pygame
+            from pygame.locals import DOUBLEBUF, OPENGL
+            # create a window, OpenGL functions are callable after window initialization,
+            # the error will say that
+            pygame.init()
+            pygame.display.set_mode((width, height), flags=DOUBLEBUF|OPENGL,
+                                    vsync=int(self.args.vsync))
+            # set the mouse position to the center of the screen:
+            pygame.mouse.set_pos([width/2, height/2])
+            # set_visible and set_grab together with pygame.mouse.get_rel make a full 360°
+            # rotaion possible, not restricted to screen -> called: virtual input mode!
+            pygame.mouse.set_visible(False)
+            # mouse can no longer leave the window:
+            pygame.event.set_grab(True)
+
+        # OpenGL initialization:
+        glViewport(0, 0, width, height)
+        glEnable(GL_DEPTH_TEST)
+        glClearColor(1.0, 1.0, 1.0, 1.0)
+        glEnable(GL_LINE_SMOOTH)
+        glLineWidth(4)
+        glPointSize(8)
+
+        # the phases of each frame are timed if enabled (close to no cost otherwise):
+        from profiler import Profiler
+        self.profiler = Profiler(enabled=self.args.profile is not None or self.args.profile_overlay)
+        # frame pacing and the fixed timestep of the animation:
+        self.scheduler = Scheduler(self.args.fps, self.args.update_rate,
+                                   self.args.idle_fps, self.args.vsync)
+
+    def initShader(self):
+        # create the shader program to run on the gpu (or load it from the cache):
+        shader = Shader(os.path.join(DIRECTORY, "shader.vs"), os.path.join(DIRECTORY, "shader.fs"),
+                        cache_directory=SHADER_CACHE_DIRECTORY)
+        shader.use()
+        self.shader = shader
+
+        # set the uniform color to black (the corresponding shader must be in use):
+        shader.setVector("lineColor", 0.0, 0.0, 0.0)
+
+        # view and projection are shared by all programs with the Camera block:
+        self.camera_ubo = UniformBuffer(["projection", "view"], 0)
+        shader.bindUniformBlock("Camera", self.camera_ubo.binding)
+
+        self.camera = Camera()
+        self.camera_ubo.setMatrix("view", self.camera.getViewMatrix())
+        projection = glm.perspective(glm.radians(45.0), self.width/self.height, 0.1, 100.0)
+        self.camera_ubo.setMatrix("projection", projection)
+
+    def initBones(self, n=10, r=2):
+        self.n = n
+        # the static meshes and the pose atlas share the buffers of the pool:
+        self.pool = GeometryPool()
+        # the geometry is loaded from the cache after the first start:
+        positions, colors, indices = getCached(createStartPoints, n=n, r=r, color=[1.0, 0.0, 0.0, 1.0])
+        self.start_points = Mesh(positions, colors, indices, pool=self.pool)
+
+        positions, colors, indices = getCached(createEndPoints, n=n, r=r, color=[0.0, 1.0, 0.0, 1.0])
+        self.end_points = Mesh(positions, colors, indices, pool=self.pool)
+
+    def reloadPoses(self, r):
+        """
+        Animates to the end points of the radius r, the old end points and
+        pose atlas are released and the pool is compacted
+        """
+        # not cached, r can be any value:
+        positions, colors, indices = createEndPoints(self.n, r, [0.0, 1.0, 0.0, 1.0])
+        end_points = Mesh(positions, colors, indices, pool=self.pool)
+        self.end_points.delete()
+        self.end_points = end_points
+        self.animation.reload(self.start_points, end_points)
+        if self.worker is not None:
+            self.worker.reload(self.start_points.positions, end_points.positions)
+        if self.scene is not None:
+            self.scene.delete()
+            self.scene = None
+            self.initScene()
+        # other poses, the bones are picked from a new BVH:
+        self.picker = None
+        self.pool.compact()
+
+    def initAnimation(self):
+        self.animation = Animation(self.start_points, self.end_points, self.args.speed,
+                                   pool=self.pool)
+        colors = np.tile(np.array([0.0, 0.0, 1.0, 1.0], dtype=np.float32), (self.n, 1))
+        self.animation.createAtlas(colors, self.end_points.indices)
+
+    def initSkin(self, m=32, r=0.5):
+        # m = 32 is the blender default value for number of vertices of a circle
+        self.m = m
+        self.skin_radius = r
+        positions, colors, indices = getCached(createCylinder, m=m, r=r, color=[0.0, 1.0, 0.0, 1.0])
+
+        # the colors of the skin show the pressure, they change every frame:
+        self.skin_mesh = Mesh(positions, colors, indices, dynamic_colors=True,
+                              color_update=self.args.color_update)
+
+        objectSize = m + 1 # the number of positions of a cirlce
+        self.shader.setInt("objectSize", objectSize)
+
+        # draw the skin with instancing, the model matrices of the circles of each
+        # cached pose are uploaded once:
+        self.skin = Skin(self.skin_mesh, m, self.n)
+        self.animation.setSkin(self.skin)
+        self.animation.updatePose()
+
+    def initScene(self):
+        # all actuators share skin_mesh, their state is packed into arrays:
+        if self.args.actuators <= 1:
+            return
+        from scene import ActuatorScene, createGrid
+        scene = ActuatorScene(self.skin_mesh, self.m, self.start_points.positions,
+                              self.end_points.positions, createGrid(self.args.actuators),
+                              r=self.skin_radius, threshold=self.args.lod_threshold)
+        scene.setViewport(45.0, self.height)
+        # the wave runs along the rows of the grid:
+        self.scene_phases = (scene.positions[:, 0] - scene.positions[:, 0].min()) * 0.05
+        self.scene_clock = 0.0
+        self.scene = scene
+        print(scene)
+
+    def initSensor(self):
+        # the sensor data is read in the background (or replayed):
+        if self.args.replay is not None:
+            from recording import ReplayInput
+            self.sensor = ReplayInput(self.args.replay, speed=self.args.replay_speed)
+            print(self.sensor.recording)
+        elif self.args.sensor is not None:
+            from sensor import SensorInput
+            self.sensor = SensorInput(self.args.sensor, delay=self.args.sensor_delay)
+            if self.args.record is not None:
+                from recording import RecordingWriter
+                self.recorder = RecordingWriter(self.args.record)
+        if self.sensor is not None:
+            # the samples are filtered before they select the pose and the colors:
+            rate = self.args.sensor_rate
+            if self.args.replay is not None and len(self.sensor.recording) > 1:
+                recording = self.sensor.recording
+                rate = (len(recording) - 1) / max(recording.end_time - recording.start_time, 1e-9)
+            from filters import parseFilters
+            from colormap import Colormap
+            self.filters = parseFilters(self.args.filters, rate)
+            self.sensor.start()
+            self.colormap = Colormap()
+
+        # recording of the frames (toggled with the c key):
+        if self.args.capture is not None:
+            from capture import FrameCapture
+            self.capture = FrameCapture(self.width, self.height, self.args.capture)
+
+    def initWorker(self):
+        if self.args.subscribe is not None:
+            # the poses come from a publisher (see broadcast.py):
+            from broadcast import PoseSubscriber
+            from colormap import Colormap
+            self.subscriber = PoseSubscriber(self.args.subscribe)
+            self.subscriber.start()
+            self.colormap = Colormap()
+            return
+        # the poses (and the sensor input) are computed in a worker thread, the
+        # wave of the actuator grid stays in the render thread:
+        if not self.args.threaded or (self.scene is not None and self.sensor is None):
+            return
+        from simulation import SimulationWorker
+        self.worker = SimulationWorker(self.start_points.positions, self.end_points.positions,
+                                       self.args.speed, self.args.update_rate, sensor=self.sensor,
+                                       filters=self.filters, recorder=self.recorder,
+                                       resolution=self.animation.evaluator.resolution)
+        self.worker.start()
+
+    def consumeState(self):
+        """
+        Shows the newest pose state of the worker thread, returns True if the
+        scene changed
+        """
+        state = self.worker.acquire()
+        if state is None:
+            return False
+        values = (state.p, state.pressure)
+        if values == self.sensor_values:
+            return False
+        pressure_changed = self.sensor_values is None or state.pressure != self.sensor_values[1]
+        self.sensor_values = values
+        if self.scene is not None:
+            self.scene.setBends(state.p)
+            if state.pressure is not None:
+                self.scene.setPressures(state.pressure)
+            return True
+        self.animation.setPose(state.p, state.positions, state.transforms)
+        if state.pressure is not None and pressure_changed:
+            self.skin_mesh.updateColors(np.broadcast_to(self.colormap(state.pressure),
+                                                        self.skin_mesh.color_data.shape))
+        return True
+
+    def consumeStream(self):
+        """
+        Shows the newest pose received from the publisher, returns True if
+        there was a new one
+        """
+        state = self.subscriber.acquire()
+        if state is None or len(state.positions) != self.n:
+            return False
+        pressure_changed = self.sensor_values is None or state.pressure != self.sensor_values[1]
+        self.sensor_values = (state.p, state.pressure)
+        if self.scene is not None:
+            self.scene.setBends(state.p)
+            if state.pressure is not None:
+                self.scene.setPressures(state.pressure)
+            return True
+        self.animation.showPose(state.positions, state.transforms)
+        if state.pressure is not None and pressure_changed:
+            self.skin_mesh.updateColors(np.broadcast_to(self.colormap(state.pressure),
+                                                        self.skin_mesh.color_data.shape))
+        return True
+
+    def pick(self, x=None, y=None):
+        """
+        Picks the ring under the pixel (x, y), by default the center of the
+        window (the mouse turns the camera, see run), prints and returns
+        (actuator, ring, position, pressure) or None
+        """
+        start = time.perf_counter()
+        x = self.width / 2.0 if x is None else x
+        y = self.height / 2.0 if y is None else y
+        from picking import BonePicker, getPickRay
+        if self.picker is None:
+            self.picker = BonePicker(self.skin_radius)
+            self.pick_slots = None
+        # only the actuators which moved since the last pick are refit:
+        if self.scene is not None:
+            slots = self.scene.getSlots()
+            if self.pick_slots is None:
+                self.picker.update(self.scene.getBones())
+            else:
+                moved = np.flatnonzero(slots != self.pick_slots)
+                self.picker.update(self.scene.getBones(moved), moved)
+            self.pick_slots = slots
+        else:
+            self.picker.update(self.animation.positions[None])
+        hit = self.picker.pick(*getPickRay(self.camera, x, y, self.width, self.height, 45.0))
+        milliseconds = (time.perf_counter() - start) * 1000.0
+        if hit is None:
+            print("Pick -- nothing ({:.3f} ms)".format(milliseconds))
+            return None
+        actuator, ring, position, distance = hit
+        if self.scene is not None:
+            pressure = float(self.scene.pressures[actuator])
+        else:
+            pressure = self.sensor_values[1] if self.sensor_values is not None else None
+        print("Pick -- actuator: {}, ring: {}, position: ({:.3f}, {:.3f}, {:.3f}), pressure: {}, "
+              "distance: {:.2f} ({:.3f} ms)".format(
+              actuator, ring, *position, "-" if pressure is None else "{:.3f}".format(pressure),
+              distance, milliseconds))
+        return actuator, ring, position, pressure
+
+    def drawFrame(self):
+        """
+        Draws one frame of the scene, used by the interactive loop and the headless
+        benchmark alike
+        """
+        profiler, shader, animation, n = self.profiler, self.shader, self.animation, self.n
+        with profiler.phase("clear"):
+            glClear(GL_COLOR_BUFFER_BIT|GL_DEPTH_BUFFER_BIT)
+
+        with profiler.phase("view update"):
+            # update the view matrix in the shader to simulate the camera's view:
+            view = self.camera.getViewMatrix()
+            self.camera_ubo.setMatrix("view", view)
+
+        shader.setInt("lflag", 0)
+        shader.setInt("tsflag", 0)
+
+        """---uncomment this section to see the skin in detail and still for pose i---"""
+        # animation.setBend(1.0)
+        # i = animation.pose_nr
+        # self.skin.draw(shader, i)
+        #
+        # model1 = glm.mat4()
+        # shader.setMatrix("model1", model1)
+        # model2 = glm.mat4()
+        # shader.setMatrix("model2", model2)
+        #
+        # shader.setInt("lflag", 0)
+        # animation.atlas.draw(i, GL_LINE_STRIP, 2*(n-2)+2, 0)
+        # shader.setInt("lflag", 1)
+        # animation.atlas.draw(i, GL_POINTS, n, 2*(n-2)+2)
+        """----------------------------------------------------------------"""
+
+        """---uncomment this section to see the animation bounds---"""
+        # # draw the lines:
+        # self.start_points.draw(GL_LINE_STRIP, 2*(n-2)+2, 0)
+        # self.end_points.draw(GL_LINE_STRIP, 2*(n-2)+2, 0)
+        # # draw the points:
+        # shader.setInt("lflag", 1)
+        # self.start_points.draw(GL_POINTS, n, 2*(n-2)+2)
+        # self.end_points.draw(GL_POINTS, n, 2*(n-2)+2)
+        """--------------------------------------------------------"""
+
+        if self.scene is not None:
+            with profiler.phase("skin draw"):
+                self.scene.draw(shader, self.camera.position)
+            return
+
+        """---uncomment this section to see the animation in motion between start and end pose---"""
+        # draw the animation:
+        with profiler.phase("bone draw"):
+            model1 = glm.mat4()
+            shader.setMatrix("model1", model1)
+            model2 = glm.mat4()
+            shader.setMatrix("model2", model2)
+
+            shader.setInt("lflag", 0)
+            animation.atlas.draw(animation.pose_nr, GL_LINE_STRIP, 2*(n-2)+2, 0)
+            shader.setInt("lflag", 1)
+            animation.atlas.draw(animation.pose_nr, GL_POINTS, n, 2*(n-2)+2)
+
+        # uncomment the next line and it will apply the skin to the animation
+        with profiler.phase("skin draw"):
+            self.skin.draw(shader, animation.pose_nr)
+        """-------------------------------------------------------------------------------------"""
+
+    def updateAnimation(self, deltaTime):
+        """
+        Advances the animation by deltaTime seconds (or selects the pose of the
+        sensor data), returns True if the scene changed
+        """
+        scene = self.scene
+        if self.sensor is not None:
+            # follow the newest sensor data, the ring buffer is drained without
+            # waiting for the sensor:
+            samples = self.sensor.update()
+            if self.recorder is not None:
+                self.recorder.write(samples)
+            if self.filters is not None:
+                # the newest filtered sample:
+                filtered = self.filters.process(samples)
+                values = self.sensor_values
+                if len(filtered):
+                    values = tuple(float(x) for x in np.clip(filtered[-1, 1:3], 0.0, 1.0))
+            else:
+                values = self.sensor.getValues()
+            if values is None or values == self.sensor_values:
+                return False
+            self.sensor_values = values
+            bend, pressure = values
+            if scene is not None:
+                # all actuators follow the sensor:
+                scene.setBends(bend)
+                scene.setPressures(pressure)
+                return True
+            self.animation.setBend(bend)
+            # color the skin with the pressure (only the color buffer changes):
+            self.skin_mesh.updateColors(np.broadcast_to(self.colormap(pressure),
+                                                        self.skin_mesh.color_data.shape))
+            return True
+        if scene is not None:
+            if self.animation.paused:
+                return False
+            self.scene_clock += self.animation.speed * deltaTime
+            # back and forth (triangle wave), shifted along the rows:
+            bends = np.abs((self.scene_clock + self.scene_phases) % 2.0 - 1.0)
+            scene.setBends(bends)
+            scene.setPressures(bends)
+            return True
+        # to increase or decrease the bend:
+        return self.animation.advance(deltaTime)
+
+    def endFrame(self):
+        # uniform uploads of this frame (issued, skipped):
+        self.uniform_uploads = [a + b for a, b in zip(self.shader.resetUploadCounts(),
+                                                      self.camera_ubo.resetUploadCounts())]
+        self.profiler.endFrame(draw_calls=Mesh.draw_calls,
+                               uniform_uploads=self.uniform_uploads[0],
+                               skipped_uniform_uploads=self.uniform_uploads[1])
+        Mesh.draw_calls = 0
+
+    def runHeadless(self):
+        """
+        Renders the frames as fast as possible and reports the throughput, the
+        pose sequence is either given (--poses) or the animation back and forth
+        """
+        args = self.args
+        bends = np.load(args.poses) if args.poses is not None else None
+        latencies = []
+        for frame in range(args.frames):
+            start = time.perf_counter()
+            if bends is not None and self.scene is not None:
+                self.scene.setBends(bends[frame % len(bends)])
+            elif bends is not None:
+                self.animation.setBend(bends[frame % len(bends)])
+            elif self.subscriber is not None:
+                self.consumeStream()
+            elif self.worker is not None:
+                self.consumeState()
+            else:
+                # one animation update per frame, independent of the frame time:
+                self.updateAnimation(self.scheduler.timestep)
+            self.drawFrame()
+            if self.capture is not None:
+                self.capture.capture()
+            # wait for the GPU, otherwise only the submission is measured:
+            glFinish()
+            latencies.append(time.perf_counter() - start)
+            self.endFrame()
+        from headless import getThroughput
+        report = getThroughput(latencies)
+        print("Headless rendering {}x{} ({}) -- frames: {}, frames/s: {:.1f}".format(
+              self.width, self.height, args.headless, report["frames"], report["fps"]))
+        print("Frame latency[ms] -- p50: {:.3f}, p90: {:.3f}, p99: {:.3f}, max: {:.3f}".format(
+              report["p50_ms"], report["p90_ms"], report["p99_ms"], report["max_ms"]))
+        if self.capture is not None:
+            self.capture.finish()
+        if self.worker is not None:
+            # the worker writes into the recording:
+            self.worker.stop()
+            print(self.worker)
+        if self.subscriber is not None:
+            self.subscriber.stop()
+            print(self.subscriber)
+        if self.recorder is not None:
+            self.recorder.close()
+            print(self.recorder)
+        if self.filters is not None:
+            print(self.filters)
+        if args.profile is not None:
+            self.profiler.export(args.profile)
+        self.framebuffer.destroy()
+        self.context.destroy()
+        return report
+
+    def shutdown(self):
+        """Ends the program, the recording and the profile are finished first"""
+        import pygame
+        print(self.animation.evaluator)
+        print(self.pool)
+        print("Meshes:", Mesh.live)
+        print("Uniform uploads of the last frame -- issued:", self.uniform_uploads[0],
+              "skipped:", self.uniform_uploads[1])
+        if self.picker is not None:
+            print(self.picker)
+        if self.capture is not None:
+            self.capture.finish()
+        if self.worker is not None:
+            # the worker writes into the recording:
+            self.worker.stop()
+            print(self.worker)
+        if self.subscriber is not None:
+            self.subscriber.stop()
+            print(self.subscriber)
+        if self.recorder is not None:
+            self.recorder.close()
+            print(self.recorder)
+        if self.filters is not None:
+            print(self.filters)
+        if self.args.profile is not None:
+            self.profiler.export(self.args.profile)
+        pygame.quit()
+        sys.exit()
+
+    def run(self):
+        """The window loop, runs until escape is pressed or the window is closed"""
+        import pygame
+        from pygame.locals import QUIT, KEYDOWN, KEYUP, MOUSEMOTION, MOUSEBUTTONDOWN, K_ESCAPE, K_c, K_r, K_SPACE, K_w, K_a, K_s, K_d
+        # keys which move the camera:
+        directions = {K_w: "forward", K_a: "left", K_s: "backward", K_d: "right"}
+        moving = set()
+        camera, scheduler, profiler = self.camera, self.scheduler, self.profiler
+
+        # game loop
+        while True:
+            deltaTime = scheduler.beginFrame()
+            # the scene is redrawn at the full frame rate only while something changes:
+            changed = self.capture is not None
+
+            # input handler:
+            with profiler.phase("event handling"):
+                for event in pygame.event.get():
+                    if event.type == QUIT:
+                        self.shutdown()
+                    elif event.type == KEYDOWN:
+                        if event.key == K_ESCAPE:
+                            self.shutdown()
+                        if event.key == K_c:
+                            # start or stop the recording, each one in a new file or directory:
+                            if self.capture is None:
+                                from capture import FrameCapture, getSessionPath
+                                path = getSessionPath(self.args.capture or "capture")
+                                self.capture = FrameCapture(self.width, self.height, path)
+                            else:
+                                self.capture.finish()
+                                self.capture = None
+                        if event.key == K_r:
+                            # new end pose (bend radius 1.5,... 2.5):
+                            self.reloadPoses(np.random.uniform(1.5, 2.5))
+                            changed = True
+                        if event.key == K_SPACE:
+                            # pause or continue the animation:
+                            self.animation.paused = not self.animation.paused
+                            if self.worker is not None:
+                                self.worker.paused = self.animation.paused
+                        if event.key in directions:
+                            moving.add(directions[event.key])
+                    elif event.type == KEYUP:
+                        if event.key in directions:
+                            moving.discard(directions[event.key])
+                    elif event.type == MOUSEMOTION:
+                        # virtual input mode (see pygame):
+                        x, y = pygame.mouse.get_rel()
+                        camera.processMouseMovement(x, -y)
+                        changed = True
+                    elif event.type == MOUSEBUTTONDOWN and event.button == 1:
+                        # the cursor is hidden, the ring in the center of the window is picked:
+                        self.pick()
+
+                for direction in moving:
+                    camera.processKeyboard(direction, deltaTime)
+                    changed = True
+
+            # the animation advances with a fixed timestep, independent of the
+            # frame rate:
+            with profiler.phase("animation update"):
+                if self.subscriber is not None:
+                    changed = self.consumeStream() or changed
+                elif self.worker is not None:
+                    # the worker thread steps the animation, only the newest state is shown:
+                    changed = self.consumeState() or changed
+                else:
+                    for _ in range(scheduler.getUpdateSteps()):
+                        if self.updateAnimation(scheduler.timestep):
+                            changed = True
+
+            self.drawFrame()
+            if self.capture is not None:
+                self.capture.capture()
+
+            # when using the OPENGL pygame display mode this is equivalent to
+            # the swap buffer function, we need that to actually see something!
+            with profiler.phase("flip"):
+                pygame.display.flip()
+
+            self.endFrame()
+            if self.args.profile_overlay and profiler.summary:
+                pygame.display.set_caption(profiler.summary)
+
+            # sleep until the next frame is due (longer while idle):
+            scheduler.endFrame(idle=not changed)